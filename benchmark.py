@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""Scaling benchmark: generate synthetic rosters of several sizes, build and solve each, write JSON.
+
+Every size runs in a fresh worker process so the peak RSS reported is that case's own. The JSON
+carries the git commit and the solver settings, so files from different commits can be compared.
+It also records the startup cost: importing the scheduler in a fresh interpreter, and the slowest
+imports (python -X importtime)."""
+import concurrent.futures
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from absl import app
+from absl import flags
+
+from config import *
+import generate_roster
+import shift_scheduling_hospital as scheduler
+from ortools.sat.python import cp_model
+
+_SIZES = flags.DEFINE_string("sizes", "25,50,100,200,500", "Comma separated staff counts to benchmark.")
+_BENCH_SOLVE_TIME = flags.DEFINE_float("bench_solve_time", 10, "Solve time limit (seconds) for each size.")
+_BENCH_OUTPUT = flags.DEFINE_string("bench_output", "benchmark.json", "Where to write the JSON results.")
+_KEEP_CSV = flags.DEFINE_string("keep_csv", "", "Directory to keep the generated csvs in (default: a temp dir).")
+_IMPORT_RUNS = flags.DEFINE_integer("import_runs", 5, "Fresh interpreters timed importing the scheduler (0 skips it).")
+
+
+class ObjectiveRecorder(cp_model.CpSolverSolutionCallback):
+    """Record (wall time, objective) for every improving solution."""
+
+    def __init__(self):
+        cp_model.CpSolverSolutionCallback.__init__(self)
+        self.trace = []
+
+    def on_solution_callback(self) -> None:
+        self.trace.append((round(self.wall_time, 3), self.objective_value))
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ""
+
+
+def measure_startup(runs, top=8):
+    """Best-of-runs wall time of a bare interpreter and of one importing the scheduler, plus the
+    scheduler's own imports that take longest (cumulative microseconds from -X importtime)."""
+    here = os.path.dirname(os.path.abspath(__file__))
+
+    def best(code):
+        times = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-c", code], cwd=here, check=True)
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    interpreter = best("pass")
+    imported = best("import shift_scheduling_hospital")
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", "import shift_scheduling_hospital"],
+                            cwd=here, capture_output=True, text=True).stderr
+    slowest = []
+    for line in stderr.splitlines():
+        fields = line.split("|")
+        # "import time: self [us] | cumulative | name" with the name indented two more spaces per
+        # nesting level: the scheduler itself is at " name", its direct imports at "   name"
+        if len(fields) == 3 and fields[1].strip().isdigit() and fields[2].startswith("   ") \
+                and not fields[2].startswith("    "):
+            slowest.append((fields[2].strip(), int(fields[1])))
+    slowest.sort(key=lambda item: -item[1])
+    return {
+        "interpreter_seconds": round(interpreter, 4),
+        "import_seconds": round(imported - interpreter, 4),
+        "slowest_imports_us": slowest[:top],
+    }
+
+
+def run_case(path, solve_time):
+    """Build and solve one csv. Returns the result dict for the JSON file."""
+    start = time.perf_counter()
+    list_data = scheduler.read_input(path)
+    read_seconds = time.perf_counter() - start
+    cost_literals = []
+    cost_coefficients = []
+    work = {}
+    virtual_work = {}
+    black_listed = {}
+    employees = []
+    employees_stats = []
+    scheduler.format_input(list_data, employees, employees_stats)
+
+    profiler = scheduler.BuildProfiler()
+    start = time.perf_counter()
+    model = scheduler.build_model(cost_literals, cost_coefficients, work, virtual_work, black_listed, employees,
+                                  employees_stats, [], profiler=profiler)
+    build_seconds = time.perf_counter() - start
+    if model is None:
+        return {"staff": len(employees), "status": "MODEL_INVALID"}
+
+    solver = cp_model.CpSolver()
+    profile = scheduler.apply_solver_profile(solver, "main")
+    solver.parameters.max_time_in_seconds = solve_time
+    recorder = ObjectiveRecorder()
+    status = solver.solve(model, recorder)
+    solved = status in (cp_model.OPTIMAL, cp_model.FEASIBLE)
+
+    return {
+        "staff": len(employees),
+        "read_seconds": round(read_seconds, 4),
+        "build_seconds": round(build_seconds, 4),
+        "variables": len(model.Proto().variables),
+        "constraints": len(model.Proto().constraints),
+        "objective_terms": len(cost_literals),
+        "families": profiler.families,
+        "profile": profile,
+        "status": solver.status_name(status),
+        "solve_seconds": round(solver.wall_time, 3),
+        "first_solution_seconds": recorder.trace[0][0] if recorder.trace else None,
+        "objective": solver.objective_value if solved else None,
+        "best_bound": solver.best_objective_bound if solved else None,
+        "objective_trace": recorder.trace,
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def main(_):
+    sizes = [int(x) for x in _SIZES.value.split(",")]
+    smallest = max((e for grp in exclusive_groups for e in grp), default=-1) + 1
+    if min(sizes) < smallest:
+        print(f"exclusive_groups in config.py need at least {smallest} employees")
+        return
+
+    startup = measure_startup(_IMPORT_RUNS.value) if _IMPORT_RUNS.value > 0 else None
+    if startup:
+        print(f"startup: import {startup['import_seconds']:.3f}s on top of a {startup['interpreter_seconds']:.3f}s "
+              f"interpreter; slowest: " + ", ".join(f"{name} {us / 1000:.0f} ms" for name, us in startup["slowest_imports_us"][:4]))
+
+    csv_dir = _KEEP_CSV.value or tempfile.mkdtemp(prefix="roster-")
+    os.makedirs(csv_dir, exist_ok=True)
+    results = []
+    for staff in sizes:
+        path = os.path.join(csv_dir, f"synthetic_{staff}.csv")
+        generate_roster.write_roster(path, generate_roster.generate_roster(staff, seed=staff))
+        # a fresh process per case: ru_maxrss only ever grows, so a shared process would report the
+        # largest case so far. fork keeps the parsed flags (--main_profile) in the worker
+        with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("fork")) as pool:
+            result = pool.submit(run_case, path, _BENCH_SOLVE_TIME.value).result()
+        first = result.get("first_solution_seconds")
+        print(f"{staff:4d} staff: build {result.get('build_seconds', 0):.2f}s, "
+              f"{result.get('variables', 0)} vars, {result.get('constraints', 0)} constraints, {result['status']}"
+              + (f" (first solution {first}s, objective {result['objective']:.0f})" if first is not None else "")
+              + f", peak RSS {result.get('peak_rss_kb', 0) // 1024} MB")
+        results.append(result)
+
+    with open(_BENCH_OUTPUT.value, "w") as f:
+        json.dump({
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "solve_time": _BENCH_SOLVE_TIME.value,
+            "sparse_model": sparse_model,
+            "limits_encoding": scheduler.limits_encoding_name(),
+            "close_encoding": scheduler.close_encoding_name(),
+            "symmetry_breaking": scheduler.symmetry_breaking_enabled(),
+            "month_days": month_days,
+            "startup": startup,
+            "results": results,
+        }, f, indent=2)
+    print(f"results written to {_BENCH_OUTPUT.value}")
+
+
+if __name__ == "__main__":
+    app.run(main)
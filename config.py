@@ -12,6 +12,36 @@ filename = '202608k.csv'
 max_solve_time = 40
 max_solve_time_check = 4
 colab_execution=False
+sparse_model = True
+cache_dir = ".schedule_cache"
+cache_max_bytes = 200 * 1024 * 1024
+incremental_radius = 1
+incremental_solve_time = 2
+incremental_change_penalty = 200
+# stop a solve once the objective is within early_stop_gap (relative) of the best bound, or when no
+# better solution was found for early_stop_plateau seconds; 0 disables either test
+early_stop_gap = 0.01
+early_stop_plateau = 10
+# named CP-SAT parameter sets (SatParameters field: value); "default" keeps the solver defaults
+solver_profiles = {
+    "default": {},
+    "portfolio": {"num_workers": 16, "linearization_level": 2},
+    "fast": {"num_workers": 8, "linearization_level": 0, "cp_model_probing_level": 0},
+    "diagnostic": {"num_workers": 8, "linearization_level": 0, "cp_model_probing_level": 0},
+    "check": {"linearization_level": 0, "cp_model_probing_level": 0, "stop_after_first_solution": True},
+    "debug": {"num_workers": 1, "log_search_progress": True, "log_to_stdout": True},
+}
+# "reified": a literal per total / limit comparison, "table": one allowed-assignments constraint per family
+limits_encoding = "reified"
+# "reified": penalty literal equivalent to the pattern, "clause": one clause forcing it on
+close_encoding = "reified"
+# order the schedules of interchangeable employees (same class, MIN/MAX, flags and marks, in no
+# exclusive group) so the solver does not explore their permutations
+symmetry_breaking = True
+main_solve_profile = "default"
+# the diagnosis has to prove infeasibility: the light "diagnostic" profile rarely does so in time
+diagnostic_solve_profile = "default"
+check_solve_profile = "check"
 #end options
 ################################################################################
 
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""Synthetic input csv generator for shift_scheduling_hospital.py.
+
+The rosters follow the shape of the real ones (class mix, MIN/MAX around the monthly demand,
+extra nights / virtual reserves for the senior classes, N marks in whole-day blocks) so that
+build and solve time can be measured for staff counts well beyond the ~25 doctors we have."""
+import csv
+
+import numpy
+from absl import app
+from absl import flags
+
+from config import *
+import shift_scheduling_hospital as scheduler
+
+_STAFF = flags.DEFINE_integer("staff", 25, "Number of employees (rows) to generate.")
+_SEED = flags.DEFINE_integer("seed", 0, "Random seed; the same seed and options give the same csv.")
+_OUTPUT = flags.DEFINE_string("output", "synthetic.csv", "Where to write the csv.")
+_CLASS_MIX = flags.DEFINE_string(
+    "class_mix", "", "Relative weight per level, e.g. 'AA:2,A:8,B:4,C:4,D:3,E:1' (default: the mix of the real roster)."
+)
+_N_DENSITY = flags.DEFINE_float("n_density", 0.35, "Share of days an employee marks N (unavailable).")
+_P_DENSITY = flags.DEFINE_float("p_density", 0.01, "Share of available day parts marked P (must work).")
+_WN_DENSITY = flags.DEFINE_float("wn_density", 0.0, "Share of available day parts marked WN (rather not).")
+_WP_DENSITY = flags.DEFINE_float("wp_density", 0.0, "Share of available day parts marked WP (would like to).")
+_HOLIDAY_N_FACTOR = flags.DEFINE_float(
+    "holiday_n_factor", 1.5, "N marks are this many times as likely on weekends and public holidays."
+)
+
+# class mix of the 2026-08 roster
+default_class_mix = {"AA": 2, "A": 8, "B": 4, "C": 4, "D": 3, "E": 1}
+
+# classes that take the extra night / virtual reserve / gift shift duties in the real rosters
+senior_levels = ["AA", "A"]
+
+
+def parse_class_mix(text):
+    """'AA:2,A:8' -> {"AA": 2.0, "A": 8.0}; an empty string gives default_class_mix."""
+    if not text:
+        return dict(default_class_mix)
+    mix = {}
+    for item in text.split(","):
+        level, weight = item.split(":")
+        if level not in levels:
+            raise ValueError(f"unknown level '{level}', expected one of {list(levels)}")
+        mix[level] = float(weight)
+    return mix
+
+
+def generate_roster(staff, seed=0, class_mix=None, n_density=0.35, p_density=0.01, wn_density=0.0,
+                    wp_density=0.0, holiday_n_factor=1.5):
+    """Rows (header first) of a synthetic input csv for the month configured in config.py."""
+    rng = numpy.random.default_rng(seed)
+    mix = class_mix or default_class_mix
+    names = list(mix)
+    weights = numpy.array([mix[x] for x in names], dtype=float)
+    classes = rng.choice(names, size=staff, p=weights / weights.sum())
+
+    # spread the month's demand so that sum(MIN) < required < sum(MAX), like the real rosters
+    cal = scheduler.ShiftCalendar()
+    required = int(cal.required.sum())
+    load = required / staff
+    # nobody gets fewer than 3 shifts of room: below that the night / internal limit tables leave no nights
+    max_shifts = numpy.clip(numpy.round(max(load, 3) * rng.uniform(1.0, 1.3, staff)), 1, 7).astype(int)
+    min_shifts = numpy.minimum(numpy.floor(load * rng.uniform(0.6, 0.85, staff)), max_shifts).astype(int)
+    while max_shifts.sum() < required * 1.05 and (max_shifts < 7).any():
+        max_shifts[rng.choice(numpy.flatnonzero(max_shifts < 7))] += 1
+    while min_shifts.sum() > required * 0.8:
+        min_shifts[rng.choice(numpy.flatnonzero(min_shifts > 0))] -= 1
+
+    day_n = numpy.where(cal.is_holiday, min(1.0, n_density * holiday_n_factor), n_density)
+    # P (must work) is only placed where it can be honoured, as in the real rosters: a required shift of
+    # that day part the employee can do, one P per day part, nights only for the extra-night takers and
+    # at most 3 (and half the MAX) per employee
+    p_taken = set()
+
+    rows = [["NAME", "CLASS", "MIN", "MAX", "EXTRA_NIGHTS", "VIRTUAL_SHIFTS", "GIFT_SHIFTS"]
+            + [f"{d + 1}{part}" for d in range(month_days) for part in "MAN"]]
+    for e in range(staff):
+        capable = [shifts.index(x) for x in levels[classes[e]]]
+        senior = classes[e] in senior_levels
+        extra_nights = int(rng.integers(0, 3)) if senior else 0
+        virtual = int(rng.integers(1, 3)) if senior and rng.random() < 0.5 else 0
+        gift = int(rng.integers(1, 5)) if senior and not virtual and rng.random() < 0.1 else 0
+
+        p_left = min(3, max_shifts[e] // 2)
+        marks = []
+        for d in range(month_days):
+            if rng.random() < day_n[d]:
+                marks += ["N", "N", "N"]
+                continue
+            day = []
+            for part in range(len(day_parts)):
+                r = rng.random()
+                can_p = (p_left > 0 and (d, part) not in p_taken and "P" not in day
+                         and (part != 2 or extra_nights > 0)
+                         and any(cal.required[d, x] for x in cal.day_part_shifts[part] if x in capable))
+                if r < p_density and can_p:
+                    p_taken.add((d, part))
+                    p_left -= 1
+                    day.append("P")
+                elif r < p_density + wp_density:
+                    day.append("WP")
+                elif r < p_density + wp_density + wn_density:
+                    day.append("WN")
+                else:
+                    day.append("")
+            marks += day
+        rows.append([f"DR{e + 1:03d}", classes[e], int(min_shifts[e]), int(max_shifts[e]),
+                     extra_nights, virtual, gift] + marks)
+    return rows
+
+
+def write_roster(path, rows):
+    with open(path, "w", newline="") as f:
+        csv.writer(f).writerows(rows)
+
+
+def main(_):
+    rows = generate_roster(_STAFF.value, _SEED.value, parse_class_mix(_CLASS_MIX.value), _N_DENSITY.value,
+                           _P_DENSITY.value, _WN_DENSITY.value, _WP_DENSITY.value, _HOLIDAY_N_FACTOR.value)
+    write_roster(_OUTPUT.value, rows)
+    print(f"wrote {len(rows) - 1} employees to {_OUTPUT.value}")
+
+
+if __name__ == "__main__":
+    app.run(main)
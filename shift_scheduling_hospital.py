@@ -1,38 +1,197 @@
 #!/usr/bin/env python3
+import contextlib
+import copy
 import shutil
 from operator import truediv
 
-import pandas
+import numpy
 from absl import app
 from absl import flags
 import os, tempfile
-import webbrowser
+import csv
+import hashlib
+import json
+import re
+import threading
+import time
+import config
 from config import *
+from google.protobuf import text_format
+from ortools.sat import cp_model_pb2
 from ortools.sat.python import cp_model
 
 month_starts_with_internal = 1 if month_starts_with_internal_shift  else 0
 
 # time budget (seconds) for each experimental re-solve during infeasibility diagnosis
 diagnostic_solve_time = 10
+# solves the diagnosis may spend narrowing conflicting rule families down to single days / employees
+diagnostic_refine_solves = 15
 
-# When RELAX_HARD is True, hard rules are turned into soft ones (a violation indicator
-# with a big penalty) so an infeasible month still yields a best-effort schedule and we
-# can report exactly which rules had to be broken. Reset per solve.
-RELAX_HARD = False
+# penalty of one broken hard rule in a relaxed solve (scaled per rule family in build_model)
 RELAX_PENALTY = 100000
-relaxations = []  # list of (bool_var, description) for softened hard-constraint violations
 
-def register_violation(model, cost_literals, cost_coefficients, description, weight=RELAX_PENALTY):
-    """Create a penalized 'this hard rule was broken' indicator and track it for reporting."""
-    v = model.new_bool_var(f"violation_{len(relaxations)}")
-    relaxations.append((v, description))
+# config values a SolveContext carries and may override; the month itself (calendar, shifts, levels,
+# the input file) stays module-wide
+context_options = [
+    "sparse_model", "pref_factor", "close_nights_range", "close_nights_penalty",
+    "close_shift_penalties", "night_limits", "holiday_limits", "internal_limits", "virtual_limits",
+    "exclusive_groups", "hot_periods", "max_solve_time", "max_solve_time_check", "diagnostic_solve_time",
+    "diagnostic_refine_solves",
+    "incremental_radius", "incremental_solve_time", "incremental_change_penalty", "early_stop_gap",
+    "early_stop_plateau", "solver_profiles", "main_solve_profile", "diagnostic_solve_profile",
+    "check_solve_profile", "limits_encoding", "close_encoding", "symmetry_breaking",
+]
+
+class SolveContext:
+    """Everything a build / solve reads or records besides the input, so solves can run side by side.
+
+    mode is "strict", "relax" or "assume". In "relax" mode hard rules are turned into soft ones (a
+    violation indicator with a big penalty, kept in relaxations) so an infeasible month still yields
+    a best-effort schedule and we can report exactly which rules had to be broken. In "assume" mode
+    every hard rule is guarded the same way, but the indicators are shared per rule group (a family,
+    one day's coverage, one employee's MIN or MAX), carry no cost and are kept in assumption_guards;
+    diagnosis then solves once with all groups assumed unbroken and reads the conflicting groups from
+    the solver. Both registries are reset by every build.
+
+    Every name in context_options is an attribute: a private copy of the config.py value (or of the
+    flag that overrides it), unless given as a keyword argument."""
+    def __init__(self, mode="strict", **overrides):
+        if mode not in ("strict", "relax", "assume"):
+            raise ValueError(f"unknown solve mode '{mode}'")
+        unknown = sorted(set(overrides) - set(context_options))
+        if unknown:
+            raise ValueError(f"{unknown} cannot be set per solve, expected some of {context_options}")
+        defaults = {
+            "limits_encoding": limits_encoding_name(),
+            "close_encoding": close_encoding_name(),
+            "main_solve_profile": solver_profile_name("main"),
+            "diagnostic_solve_profile": solver_profile_name("diagnostic"),
+            "check_solve_profile": solver_profile_name("check"),
+            "symmetry_breaking": symmetry_breaking_enabled(),
+        }
+        self.mode = mode
+        for name in context_options:
+            value = overrides[name] if name in overrides else defaults.get(name, globals()[name])
+            setattr(self, name, copy.deepcopy(value))
+        self.relaxations = []  # list of (bool_var, description) for softened hard-constraint violations
+        self.assumption_guards = {}  # rule group -> bool_var that is True when the group is broken
+        self.status = None  # CP-SAT status of the last solve_shift_scheduling with this context
+
+    @property
+    def relax_hard(self):
+        return self.mode == "relax"
+
+    @property
+    def assume_hard(self):
+        return self.mode == "assume"
+
+    def options(self):
+        return {name: getattr(self, name) for name in context_options}
+
+    def with_mode(self, mode):
+        """A fresh context with the same options in another mode."""
+        return SolveContext(mode, **self.options())
+
+    def profile_name(self, kind):
+        """Solver profile name for a kind of solve ("main", "diagnostic" or "check")."""
+        return getattr(self, f"{kind}_solve_profile")
+
+    def reset(self):
+        self.relaxations.clear()
+        self.assumption_guards.clear()
+
+def hard_rules_relaxed(ctx):
+    return ctx.mode != "strict"
+
+def register_violation(ctx, model, cost_literals, cost_coefficients, description, weight=RELAX_PENALTY, guard=None):
+    """Create a penalized 'this hard rule was broken' indicator and track it for reporting.
+
+    In "assume" mode the indicator of the rule group `guard` is returned instead (shared, no penalty)."""
+    if ctx.assume_hard:
+        if guard not in ctx.assumption_guards:
+            ctx.assumption_guards[guard] = model.new_bool_var(f"guard_{len(ctx.assumption_guards)}")
+        return ctx.assumption_guards[guard]
+    v = model.new_bool_var(f"violation_{len(ctx.relaxations)}")
+    ctx.relaxations.append((v, description))
     cost_literals.append(v)
     cost_coefficients.append(weight)
     return v
 
-
 _OUTPUT_PROTO = flags.DEFINE_string(
-    "output_proto", "", "Output file to write the cp_model proto to."
+    "output_proto", "", "Write the main cp_model proto to this file (binary; text if the name ends in 'txt'). "
+    "A run timestamp and pid are added to the name so concurrent runs do not clobber each other."
+)
+_SAVE_SCHEDULE = flags.DEFINE_string(
+    "save_schedule", "", "Write the solved schedule as an employee,day,weekday,shift csv (usable with --hint_from)."
+)
+_HINT_FROM = flags.DEFINE_string(
+    "hint_from", "", "Warm-start the solve from a schedule written with --save_schedule."
+)
+_HINT_ALIGN_WEEKDAYS = flags.DEFINE_bool(
+    "hint_align_weekdays", False, "Move the --hint_from days so their weekdays match this month (e.g. last month's pattern)."
+)
+_HINT_DAY_OFFSET = flags.DEFINE_integer(
+    "hint_day_offset", 0, "Days added to every --hint_from day (after --hint_align_weekdays)."
+)
+_INCREMENTAL_FROM = flags.DEFINE_string(
+    "incremental_from", "", "Re-solve incrementally against a schedule written with --save_schedule: only the "
+    "employees and days whose input changed are re-optimised, everything else keeps its published assignment."
+)
+_SOLVE_PROTO = flags.DEFINE_string(
+    "solve_proto", "", "Re-solve a model written with --output_proto instead of building one from the csv."
+)
+_MAIN_PROFILE = flags.DEFINE_string(
+    "main_profile", "", "solver_profiles entry for the month solve (default: main_solve_profile in config.py)."
+)
+_DIAGNOSTIC_PROFILE = flags.DEFINE_string(
+    "diagnostic_profile", "", "solver_profiles entry for the infeasibility diagnosis solves (default: diagnostic_solve_profile)."
+)
+_CHECK_PROFILE = flags.DEFINE_string(
+    "check_profile", "", "solver_profiles entry for the per-day / 5-day-window checks (default: check_solve_profile)."
+)
+_PROFILE_BUILD = flags.DEFINE_bool(
+    "profile_build", False, "Print the time, variables, constraints and objective terms of every constraint family."
+)
+_PROFILE_BUILD_JSON = flags.DEFINE_string(
+    "profile_build_json", "", "Also write the --profile_build table to this JSON file (implies --profile_build)."
+)
+_PROFILE_BUILD_CPROFILE = flags.DEFINE_bool(
+    "profile_build_cprofile", False, "Run cProfile per constraint family and print its top functions (implies --profile_build)."
+)
+_LIMITS_ENCODING = flags.DEFINE_enum(
+    "limits_encoding", None, ["reified", "table"], "Encoding of the *_limits tables (default: limits_encoding in config.py)."
+)
+_CLOSE_ENCODING = flags.DEFINE_enum(
+    "close_encoding", None, ["reified", "clause"], "Encoding of the close shifts / close nights penalties "
+    "(default: close_encoding in config.py)."
+)
+_SYMMETRY_BREAKING = flags.DEFINE_bool(
+    "symmetry_breaking", None,
+    "Order the schedules of interchangeable employees (default: symmetry_breaking in config.py); "
+    "--nosymmetry_breaking turns it off."
+)
+_STREAM_DIR = flags.DEFINE_string(
+    "stream_dir", "", "Write every improving solution of the month solve to this directory while solving "
+    "(best.csv, best.json, progress.csv; see SnapshotWriter)."
+)
+_STREAM_HTML = flags.DEFINE_bool(
+    "stream_html", False, "Also re-render best.html in --stream_dir on every improving solution (slows the search)."
+)
+_EXPORT = flags.DEFINE_string(
+    "export", "", "Export assignments, per-employee totals and penalties of the solved schedule; the format "
+    "follows the extension (.json, .csv or .parquet)."
+)
+_SWEEP_WORKERS = flags.DEFINE_integer(
+    "sweep_workers", 0, "Max worker processes for the per-day / 5-day-window feasibility sweep (0 = all cores)."
+)
+_DAY_DIAGNOSIS = flags.DEFINE_enum(
+    "day_diagnosis", "minimal", ["minimal", "sweep"],
+    "When the rule-group diagnosis is inconclusive: search a minimal set of days that cannot be covered together "
+    "(minimal), or check every single day and 5-day window (sweep)."
+)
+_RACE = flags.DEFINE_bool(
+    "race", False, "Run the relaxed (best-effort) solve in a second process next to the strict one, so an "
+    "infeasible month gets its best-effort schedule without waiting for the strict solve and the diagnosis first."
 )
 
 html_header = '''<!DOCTYPE html>
@@ -63,19 +222,53 @@ class EmployeeStat:
             self.vars_weights[weight] = []
         self.vars_weights[weight].append(var)
 
-    def print_weights(self, solver, thres):
+    def paid_weights(self, values):
+        """(variable name, weight) of the penalties paid, heaviest first; values is from solution_values()."""
         out = []
         for weight in self.vars_weights:
             for var in self.vars_weights[weight]:
-                if solver.boolean_value(var):
+                if values[var.index]:
                     out.append((str(var), weight))
-        sorted_by_second = sorted(out, key=lambda tup: tup[1], reverse=True)
+        return sorted(out, key=lambda tup: tup[1], reverse=True)
+
+    def print_weights(self, values, thres):
+        sorted_by_second = self.paid_weights(values)
         str_out = []
 
         for srt in sorted_by_second:
             str_out.append(html_bold_if(f"{str(srt[0])}: {srt[1]}", srt[1] > thres ))
         return str_out
 
+# preference marks of the input csv; the index is the code stored in Employee.prefs
+preference_codes = ["I", "WP", "P", "WN", "N"]
+PREF_I, PREF_WP, PREF_P, PREF_WN, PREF_N = range(len(preference_codes))
+
+class Employee:
+    """One input csv row, parsed once.
+
+    prefs is a days x day-parts int8 matrix of preference_codes indices (-1 for an unknown mark),
+    pref_counts the number of slots per code and capable_mask a bitmask over shift indices."""
+    __slots__ = ("name", "level", "min_shifts", "max_shifts", "extra_nights", "virtual_shifts", "gift_shifts",
+                 "prefs", "pref_counts", "capable_mask")
+
+    def __init__(self, row):
+        self.name = row[0]
+        self.level = row[1]
+        self.min_shifts = int(row[2])
+        self.max_shifts = int(row[3])
+        self.extra_nights = int(row[4])
+        self.virtual_shifts = int(row[5])
+        self.gift_shifts = int(row[6])
+        marks = row[7:]
+        self.prefs = numpy.array([preference_codes.index(m) if m in preference_codes else -1 for m in marks],
+                                 dtype=numpy.int8).reshape(-1, 3)
+        self.pref_counts = numpy.bincount(self.prefs[self.prefs >= 0], minlength=len(preference_codes))
+        self.capable_mask = sum(1 << shifts.index(x) for x in levels.get(self.level, []) if x in shifts)
+
+    def __repr__(self):
+        return (f"{self.name} - {self.level}[{self.min_shifts},{self.max_shifts}]"
+                f"[N:{self.extra_nights},V:{self.virtual_shifts},P:{self.gift_shifts}]")
+
 def is_holiday(d):
     if d == -1:
         return prev_month_last_is_holiday
@@ -111,46 +304,41 @@ def is_public_holiday(d):
         return True
     return False
 
-def get_night_shifts():
-    return [shifts.index(x) for x in day_parts[2]]
-
 def day_part_name(dp_idx):
     return ["morning", "afternoon", "night"][dp_idx] if dp_idx < 3 else str(dp_idx)
 
 def get_employee_name(employees, e):
-    return employees[e][0]
+    return employees[e].name
 
 def get_employee_level(employees, e):
-    return employees[e][1]
+    return employees[e].level
 
 def get_employee_extra_nights(employees, e):
-    return employees[e][3]
+    return employees[e].extra_nights
 
 def get_employee_virtual_shifts(employees,e):
-    return employees[e][4]
+    return employees[e].virtual_shifts
 
 def get_employee_gift_shifts(employees, e):
-    return employees[e][5]
+    return employees[e].gift_shifts
 
 def get_employee_capable_shifts(employees, e):
-    return levels[employees[e][1]]
+    return levels[employees[e].level]
+
+def can_do_shift(employees, e, s):
+    return (employees[e].capable_mask >> s) & 1 == 1
 
 def get_employee_min_shifts(employees, e):
-    return employees[e][2][0]
+    return employees[e].min_shifts
 
 def get_employee_max_shifts(employees, e):
-    return employees[e][2][1]
+    return employees[e].max_shifts
 
 def get_employee_preference(employees, e,d,i):
-    return employees[e][6][d][i]
+    return preference_codes[employees[e].prefs[d, i]]
 
 def get_prefs(employees, e, pref):
-    count = 0
-    for d in range(month_days):
-        for i in range(3):
-            if get_employee_preference(employees,e,d,i) == pref:
-                count += 1
-    return count
+    return int(employees[e].pref_counts[preference_codes.index(pref)])
 
 def get_pos_prefs(employees, e):
     return get_prefs(employees, e, "WP")
@@ -164,28 +352,45 @@ def get_neg(employees, e):
 def get_pos(employees,e):
     return get_prefs(employees, e, "P")
 
-def is_night_dp_idx(idx):
-    return idx == 2
-
-def is_night_shift(s):
-    return shifts[s] in day_parts[2]
+class ShiftCalendar:
+    """Day and shift lookup tables for the configured month.
 
-def get_day_part_shifts(part_idx):
-    return [i for i in range(len(shifts)) if shifts[i] in day_parts[part_idx]]
+    Built once per solve / report so the hot loops read NumPy arrays instead of re-deriving
+    week.index(...) and list membership on every call. Day arrays are indexed 0..month_days-1."""
+    def __init__(self):
+        days = numpy.arange(month_days)
+        self.weekday = (days + week.index(month_first_day)) % len(week)
+        self.is_saturday = self.weekday == week.index("Sa")
+        self.is_sunday = self.weekday == week.index("Su")
+        self.is_public_holiday = numpy.isin(days + 1, public_holidays)
+        self.is_holiday = self.is_saturday | self.is_sunday | self.is_public_holiday
+        self.is_other_holiday = self.is_holiday & ~self.is_saturday & ~self.is_sunday
+        self.day_cost = numpy.select([self.is_public_holiday, self.is_sunday, self.is_saturday],
+                                     [salaries["holiday"], salaries["Su"], salaries["Sa"]], salaries["weekday"])
+        self.group = (days + month_starts_with_internal) % len(shift_groups)
+        self.has_virtual_reserve = self.group == 1
+
+        self.is_night = numpy.array([sft in day_parts[2] for sft in shifts])
+        self.is_internal = numpy.array([sft in ['IM', 'IA'] for sft in shifts])
+        self.day_part = numpy.array([next(i for i, dp in enumerate(day_parts) if sft in dp) for sft in shifts])
+        self.day_part_shifts = [numpy.flatnonzero(self.day_part == i).tolist() for i in range(len(day_parts))]
+        self.night_shifts = numpy.flatnonzero(self.is_night).tolist()
+
+        # required[d, s]: shift s must be covered on day d
+        holiday_mask = numpy.array([sft in holiday_shifts for sft in shifts])
+        week_day_mask = numpy.array([sft in week_day_shifts for sft in shifts])
+        group_mask = numpy.array([[sft in grp for sft in shifts] for grp in shift_groups])
+        self.required = numpy.where(self.is_holiday[:, None], holiday_mask, week_day_mask) & group_mask[self.group]
+
+def live(literals):
+    """Drop the constant-false cells of a sparse model from a list of literals."""
+    return [lit for lit in literals if lit is not False]
 
 def can_do_internal(employees,e):
-    e_shifts = levels[get_employee_level(employees,e)]
-    for shift in e_shifts:
-        if is_internal(shifts.index(shift)):
-            return True
-    return False
+    return any(can_do_shift(employees, e, s) for s in range(len(shifts)) if is_internal(s))
 
 def can_do_external(employees, e):
-    e_shifts = levels[get_employee_level(employees,e)]
-    for shift in e_shifts:
-        if is_external(shifts.index(shift)):
-            return True
-    return False
+    return any(can_do_shift(employees, e, s) for s in range(len(shifts)) if is_external(s))
 
 def validate_input(employees):
     valid = True
@@ -246,63 +451,79 @@ def validate_input(employees):
             valid = False
 
     for e in employees:
-        if e[1] not in levels:
+        if e.level not in levels:
             valid = False
             print (f"{e} not in levels")
-        if len(e[2]) != 2:
-            valid = False
-            print("invalid shift num pref")
-        if len(e[6]) != month_days:
+        if e.prefs.shape[0] != month_days:
             valid = False
             print("invalid shift num pref days")
-        if e[5] > 0 and e[4] > 0:
+        if e.gift_shifts > 0 and e.virtual_shifts > 0:
             valid = False
             print("both virtual and gift shifts")
-        for day_pref in e[6]:
-            if len(day_pref)!=3:
-                valid = False
-                print("invalid shift num pref days len")
-            for prf in day_pref:
-                if prf not in ["I", "WP", "P", "WN", "N"]:
-                    valid = False
-                    print (f"wrong pref str {prf}")
+        if (e.prefs < 0).any():
+            valid = False
+            print (f"wrong pref str for {e.name}")
 
     return valid
 
+input_columns = ["NAME", "CLASS", "MIN", "MAX", "EXTRA_NIGHTS", "VIRTUAL_SHIFTS", "GIFT_SHIFTS"]
+
+def read_input(path):
+    """Read the input csv into the rows format_input takes, checking every line as it is read.
+
+    The rows are what pandas.read_csv(path).fillna("I").values.tolist() used to give: the counts as
+    ints and an empty preference cell as "I" (a short row is padded with "I"). Raises ValueError
+    naming the line of the first malformed row."""
+    num_columns = len(input_columns) + len(day_parts) * month_days
+    rows = []
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        # older rosters spell some columns with a space ("GIFT SHIFTS")
+        if ["_".join(h.upper().replace("_", " ").split()) for h in header[:len(input_columns)]] != input_columns:
+            raise ValueError(f"{path}:1: expected the columns {','.join(input_columns)},1M,1A,1N,...")
+        if len(header) != num_columns:
+            raise ValueError(f"{path}:1: {len(header)} columns, expected {num_columns} "
+                             f"for a {month_days} day month (month_days in config.py)")
+        for row in reader:
+            if not any(row):
+                continue
+            where = f"{path}:{reader.line_num}"
+            if len(row) > num_columns:
+                raise ValueError(f"{where}: {len(row)} cells, expected {num_columns}")
+            if not row[0] or not row[1]:
+                raise ValueError(f"{where}: NAME and CLASS must not be empty")
+            try:
+                counts = [int(cell) for cell in row[2:len(input_columns)]]
+            except ValueError:
+                raise ValueError(f"{where}: {','.join(input_columns[2:])} must be integers, "
+                                 f"got {row[2:len(input_columns)]}") from None
+            marks = [cell or "I" for cell in row[len(input_columns):]]
+            marks += ["I"] * (num_columns - len(input_columns) - len(marks))
+            unknown = sorted(set(marks) - set(preference_codes))
+            if unknown:
+                raise ValueError(f"{where}: unknown preference mark(s) {unknown}, expected one of {preference_codes}")
+            rows.append(row[:2] + counts + marks)
+    return rows
+
 def format_input(data, employees, employees_stats):
 
     for row in data:
-        out = []
-        out.append(row[0])
-        out.append(row[1])
-        out.append([int(row[2]), int(row[3])])
-        out.append(row[4])
-        out.append(row[5])
-        out.append(row[6])
-        prefs = []
-        count = 0
-        for i in range(7, len(row), 3):
-            count += 1
-            prefs.append([row[i],row[i+1],row[i+2]])
-        out.append(prefs)
-        employees.append(out)
+        employee = Employee(row)
+        employees.append(employee)
         employees_stats.append(EmployeeStat())
 
-        if month_days != count:
+        if month_days != employee.prefs.shape[0]:
             print("wrong pref data")
             employees = []
             return None
 
-def as_html_table(lines):
-    out = r"<table>"
-
+def html_table_chunks(lines):
+    """The html of a table, one row at a time."""
+    yield r"<table>"
     for line in lines:
-        out += '\n' + r'<tr>' + '\n  '
-        for row in line:
-            out += r'<td>' + str(row) + r'</td>'
-        out += '\n' + r'</tr>'
-    out += "\n" + r"</table>"
-    return out
+        yield '\n' + r'<tr>' + '\n  ' + ''.join(r'<td>' + str(row) + r'</td>' for row in line) + '\n' + r'</tr>'
+    yield "\n" + r"</table>"
 
 def html_bold(s):
     return r'<b>' + str(s) + r'</b>'
@@ -328,13 +549,114 @@ def in_brackets_if(s, cond):
     else:
         return s
 
-def print_solution(solver, status, work, virtual_work, employees, employees_stats):
+def solution_values(solver):
+    """Every variable value of a solve (CpSolver, solution callback or CachedSolution) as one array."""
+    if isinstance(solver, CachedSolution):
+        return numpy.asarray(solver.values, dtype=numpy.int64)
+    return numpy.asarray(solver.response_proto.solution, dtype=numpy.int64)
+
+def solution_arrays(solver, work, virtual_work, num_employees):
+    """The solution read once: (assigned[e, s, d], virtual[e, d], values); dead (False) cells are False."""
+    values = solution_values(solver)
+    work_index = numpy.full((num_employees, len(shifts), month_days), -1)
+    for (e, s, d), var in work.items():
+        if var is not False:
+            work_index[e, s, d] = var.index
+    virtual_index = numpy.full((num_employees, month_days), -1)
+    for (e, d), var in virtual_work.items():
+        if var is not False:
+            virtual_index[e, d] = var.index
+    padded = numpy.append(values, 0)  # index -1 (a dead cell) reads the trailing 0
+    return padded[work_index] != 0, padded[virtual_index] != 0, values
+
+def employee_totals(assigned, virtual, cal):
+    """Per-employee counts of the report's summary table, as arrays indexed by employee."""
+    per_day = assigned.sum(axis=1)  # shifts of e on d (0 or 1)
+    return {
+        "shifts": per_day.sum(axis=1),
+        "nights": assigned[:, cal.is_night, :].sum(axis=(1, 2)),
+        "internal": assigned[:, cal.is_internal, :].sum(axis=(1, 2)),
+        "holidays": per_day[:, cal.is_holiday].sum(axis=1),
+        "saturdays": per_day[:, cal.is_saturday].sum(axis=1),
+        "sundays": per_day[:, cal.is_sunday].sum(axis=1),
+        "other_holidays": per_day[:, cal.is_other_holiday].sum(axis=1),
+        "virtual": virtual.sum(axis=1),
+    }
+
+def export_schedule(path, solver, work, virtual_work, employees, employees_stats):
+    """Write assignments, per-employee totals and the paid penalties of a solve for downstream jobs.
+
+    The format follows the extension: .json (one file with the three tables), .csv (path with
+    .assignments / .employees / .penalties before the extension) or .parquet (likewise, needs pyarrow
+    or fastparquet)."""
+    import pandas  # only exports need it; plain solves start faster without it
+    cal = ShiftCalendar()
+    assigned, virtual, values = solution_arrays(solver, work, virtual_work, len(employees))
+    names = numpy.array([get_employee_name(employees, e) for e in range(len(employees))], dtype=object)
+
+    # virtual reserves get the shift index after the last shift, so rows come out in day / shift order
+    e_idx, s_idx, d_idx = numpy.nonzero(assigned)
+    ve_idx, vd_idx = numpy.nonzero(virtual)
+    employee = numpy.concatenate([e_idx, ve_idx])
+    day = numpy.concatenate([d_idx, vd_idx])
+    shift = numpy.concatenate([s_idx, numpy.full(len(ve_idx), len(shifts))])
+    order = numpy.lexsort((employee, shift, day))
+    employee, day, shift = employee[order], day[order], shift[order]
+    assignments = pandas.DataFrame({
+        "employee": names[employee],
+        "day": day + 1,
+        "weekday": numpy.array(week, dtype=object)[cal.weekday[day]],
+        "shift": numpy.array(shifts + ["VIRTUAL"], dtype=object)[shift],
+        "virtual": shift == len(shifts),
+        "holiday": cal.is_holiday[day],
+    })
+
+    totals = employee_totals(assigned, virtual, cal)
+    aggregates = pandas.DataFrame({
+        "employee": names,
+        "level": [get_employee_level(employees, e) for e in range(len(employees))],
+        "min_shifts": [get_employee_min_shifts(employees, e) for e in range(len(employees))],
+        "max_shifts": [get_employee_max_shifts(employees, e) for e in range(len(employees))],
+        **{column: counts.astype(int) for column, counts in totals.items()},
+        "penalty": [sum(w for _, w in employees_stats[e].paid_weights(values)) for e in range(len(employees))],
+    })
+
+    penalties = pandas.DataFrame(
+        [(names[e], var, weight) for e in range(len(employees)) for var, weight in employees_stats[e].paid_weights(values)],
+        columns=["employee", "variable", "weight"])
+
+    tables = {"assignments": assignments, "employees": aggregates, "penalties": penalties}
+    root, ext = os.path.splitext(path)
+    if ext == ".json":
+        with atomic_open(path) as f:
+            json.dump({name: json.loads(table.to_json(orient="records", force_ascii=False))
+                       for name, table in tables.items()}, f, ensure_ascii=False)
+    elif ext in (".csv", ".parquet"):
+        for name, table in tables.items():
+            if ext == ".csv":
+                table.to_csv(f"{root}.{name}{ext}", index=False)
+            else:
+                try:
+                    table.to_parquet(f"{root}.{name}{ext}", index=False)
+                except ImportError:
+                    print("parquet export needs pyarrow or fastparquet")
+                    return
+    else:
+        print(f"unknown export format '{ext}', expected .json, .csv or .parquet")
+        return
+    print(f"schedule exported to {path if ext == '.json' else f'{root}.{{assignments,employees,penalties}}{ext}'}")
+
+def print_solution(solver, status, work, virtual_work, employees, employees_stats, html_path=""):
+    """Render the solution tables as html and open them; with html_path, (re)write that file quietly instead."""
     num_employees = len(employees)
     num_shifts = len(shifts)
-    first_day_index = week.index(month_first_day)
+    cal = ShiftCalendar()
 
-    if status == cp_model.OPTIMAL:
+    if status == cp_model.OPTIMAL and not html_path:
         print("OPTIMAL")
+    assigned, virtual, values = solution_arrays(solver, work, virtual_work, num_employees)
+    names = [get_employee_name(employees, e) for e in range(num_employees)]
+
     output = []
     header = ["", ""]
     header += shifts
@@ -342,42 +664,26 @@ def print_solution(solver, status, work, virtual_work, employees, employees_stat
     output.append(header)
     for d in range(month_days):
         line = []
-        line.append(html_bold_if(str(d + 1), is_holiday(d)))
-        line.append(html_bold_if(week[(d + first_day_index) % 7],is_holiday(d)))
+        line.append(html_bold_if(str(d + 1), cal.is_holiday[d]))
+        line.append(html_bold_if(week[cal.weekday[d]], cal.is_holiday[d]))
         for s in range(num_shifts):
-            shift_given = False
-            for e in range(num_employees):
-                if solver.boolean_value(work[e, s, d]):
-                    line.append(html_bold_if(get_employee_name(employees,e), is_holiday(d)))
-                    shift_given = True
-            if not shift_given:
+            given = numpy.flatnonzero(assigned[:, s, d])
+            if len(given) == 0:
                 line.append("")
-        virtual_found = False
-        for e in range(num_employees):
-            if solver.boolean_value(virtual_work[e, d]):
-                line.append(html_bold_if(get_employee_name(employees,e), is_holiday(d)))
-                virtual_found = True
-                break
-        if not virtual_found:
-            line.append("")
+            for e in given:
+                line.append(html_bold_if(names[e], cal.is_holiday[d]))
+        reserve = numpy.flatnonzero(virtual[:, d])
+        line.append(html_bold_if(names[reserve[0]], cal.is_holiday[d]) if len(reserve) else "")
         output.append(line)
     # print(tabulate(output, tablefmt="html"))
 
+    totals = employee_totals(assigned, virtual, cal)
+
     out2 = []
     header2 = ["NAME", "SHIFTS", "NIGHTS", "INTERN","HOLIDAYS", "SA", "SU", "OTHER_HOL", "VIRTUAL","DAYS", "PENALTIES"]
     out2.append(header2)
     for e in range(num_employees):
         line = []
-        sft = 0
-        nght = 0
-        intern = 0
-        hdy = 0
-        su = 0
-        sa = 0
-        oh = 0
-        days = []
-        virtual_w = 0
-
         gift_str = ""
         virtual_str = ""
         if get_employee_virtual_shifts(employees,e) > 0:
@@ -387,52 +693,24 @@ def print_solution(solver, status, work, virtual_work, employees, employees_stat
         formated_name = f"{get_employee_name(employees,e)} - {get_employee_level(employees,e)}[{get_employee_min_shifts(employees,e)},{get_employee_max_shifts(employees,e)}][{get_employee_level(employees,e)}{virtual_str}{gift_str}]"
 
         line.append(formated_name)
-        for d in range(month_days):
-            if solver.boolean_value(virtual_work[e, d]):
-                virtual_w += 1
-            for s in range(num_shifts):
-                if solver.boolean_value(work[e, s, d]):
-                    #days.append(in_brackets_if( html_bold_if(str(d+1),is_holiday(d)), is_night_shift(s)))
-                    days.append(html_bold_if(in_brackets_if(str(d+1),is_night_shift(s)),is_holiday(d)))
-                    sft += 1
-                    if is_holiday(d):
-                        hdy +=1
-                    if is_saturday(d):
-                        sa += 1
-                    if is_sunday(d):
-                        su += 1
-                    if is_other_holiday(d):
-                        oh += 1
-                    if s in get_night_shifts():
-                        nght += 1
-                    if is_internal(s):
-                        intern += 1
-        line.append(sft)
-        line.append(nght)
-        line.append(intern)
-        line.append(hdy)
-        line.append(sa)
-        line.append(su)
-        line.append(oh)
-        line.append(html_bold_if(virtual_w, get_employee_virtual_shifts(employees,e) > 0))
+        # (day, shift) pairs in day order
+        days = [html_bold_if(in_brackets_if(str(d+1),cal.is_night[s]),cal.is_holiday[d]) for d, s in numpy.argwhere(assigned[e].T)]
+        for column in ["shifts", "nights", "internal", "holidays", "saturdays", "sundays", "other_holidays"]:
+            line.append(int(totals[column][e]))
+        line.append(html_bold_if(int(totals["virtual"][e]), get_employee_virtual_shifts(employees,e) > 0))
         line.append(','.join(days))
-        line.append(','.join(employees_stats[e].print_weights(solver, 80)))
+        line.append(','.join(employees_stats[e].print_weights(values, 80)))
 
         out2.append(line)
 
     out_logistics = []
     empty_shifts = [""] * 7
     out_logistics.append(["α/α", "ΒΑΘΜΟΣ", "ΟΝΟΜΑΤΕΠΩΝΥΜΟ"] + empty_shifts + ["ΑΡΙΘΜΟΣ ΕΦΗΜ."])
+    # a virtual reserve counts as the day's duty, otherwise every shift of the day does
+    duties = numpy.where(virtual, 1, assigned.sum(axis=1))
     for e in range(num_employees):
         line = [str(e+1), "", get_employee_name(employees,e)]
-        empl_shifts = []
-        for d in range(month_days):
-            if solver.boolean_value(virtual_work[e, d]):
-                empl_shifts.append(str(d+1))
-            else:
-                for s in range(num_shifts):
-                    if solver.boolean_value(work[e, s, d]):
-                        empl_shifts.append(str(d + 1))
+        empl_shifts = [str(d + 1) for d in numpy.repeat(numpy.arange(month_days), duties[e])]
         line += (empl_shifts + empty_shifts)[:7]
         has_gift = " +gift" if get_employee_gift_shifts(employees,e) > 0 else ""
         line.append(str(len(empl_shifts)) + has_gift)
@@ -443,23 +721,18 @@ def print_solution(solver, status, work, virtual_work, employees, employees_stat
     for d in range(month_days):
         line = []
         line.append(str(d + 1))
-        line.append(week_gr[(d + first_day_index) % 7])
-        if (d + month_starts_with_internal) % len(shift_groups) == 1:
+        line.append(week_gr[cal.weekday[d]])
+        if cal.has_virtual_reserve[d]:
             line.append("ΕΣ")
         else:
             line.append("EN")
 
         for day_part_i in range(len(day_parts)):
-            day_part = day_parts[day_part_i]
             part_sifts = []
-            for s in range(num_shifts):
-                for e in range(num_employees):
-                    if solver.boolean_value(work[e, s, d]) and shifts[s] in day_part:
-                        part_sifts.append(get_employee_name(employees,e))
+            for s in cal.day_part_shifts[day_part_i]:
+                part_sifts += [names[e] for e in numpy.flatnonzero(assigned[:, s, d])]
             if day_part_i == 2:
-                for e in range(num_employees):
-                    if solver.boolean_value(virtual_work[e, d]):
-                        part_sifts.append(get_employee_name(employees,e))
+                part_sifts += [names[e] for e in numpy.flatnonzero(virtual[:, d])]
             part_len = 3 if day_part_i == 1 else 2
             part_sifts = (part_sifts + empty_shifts)[:part_len]
             line +=part_sifts
@@ -471,109 +744,272 @@ def print_solution(solver, status, work, virtual_work, employees, employees_stat
         out_list = ([x for x in line if x != ""] + empty_shifts)[0:10]
         out_official2.append(out_list)
 
+    tables = [output, out2, out_logistics, out_official, out_official2]
+    if html_path:
+        with atomic_open(html_path) as f:
+            write_solution_html(f, tables)
+        return
+
     tmp = tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.html')
     try:
         print(tmp.name)
-        tmp.write(html_header)
-        tmp.write(as_html_table(output))
-        tmp.write('<br><br>')
-        tmp.write(as_html_table(out2))
-        tmp.write('<br><br>')
-        tmp.write(as_html_table(out_logistics))
-        tmp.write('<br><br>')
-        tmp.write(as_html_table(out_official))
-        tmp.write('<br><br>')
-        tmp.write(as_html_table(out_official2))
-        tmp.write(html_footer)
+        write_solution_html(tmp, tables)
     finally:
         tmp.close()
-        if colab_execution:
-            shutil.copyfile(os.path.realpath(tmp.name), os.path.join(os.path.realpath("."),"solution.html"))
-        else:
-            webbrowser.open('file://' + os.path.realpath(tmp.name))
+        open_report(tmp.name)
+
+def open_report(path):
+    """Show a written html report: in the browser, or as ./solution.html when running in colab."""
+    if colab_execution:
+        shutil.copyfile(os.path.realpath(path), os.path.join(os.path.realpath("."),"solution.html"))
+    else:
+        import webbrowser
+        webbrowser.open('file://' + os.path.realpath(path))
+
+def write_solution_html(f, tables):
+    """Stream the tables to f as one html page, without building the page in memory."""
+    f.write(html_header)
+    for i, table in enumerate(tables):
+        if i:
+            f.write('<br><br>')
+        f.writelines(html_table_chunks(table))
+    f.write(html_footer)
+
+@contextlib.contextmanager
+def atomic_open(path, mode="w", **kwargs):
+    """Open a temp file next to path and rename it over path on success, so readers never see a partial file."""
+    fd, tmp = tempfile.mkstemp(prefix=".", dir=os.path.dirname(os.path.abspath(path)))
+    os.chmod(tmp, 0o644)  # mkstemp files are private; these are meant to be read by others
+    try:
+        with os.fdopen(fd, mode, **kwargs) as f:
+            yield f
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
 
 def can_do_nights(employees,e):
-    for x in day_parts[2]:
-        if x in get_employee_capable_shifts(employees,e):
-            return True
-    return False
+    return any(can_do_shift(employees, e, shifts.index(x)) for x in day_parts[2])
 
-class MuteSolutionPrinter(cp_model.CpSolverSolutionCallback):
-    """Print intermediate solutions."""
+class EarlyStopPrinter(cp_model.CpSolverSolutionCallback):
+    """Print improving solutions (like ObjectiveSolutionPrinter) and end the search once more time will not pay.
 
-    def __init__(self):
+    Stops when the relative gap between the objective and the best bound reaches gap, when no better
+    solution has shown up for plateau seconds, or, with first_solution, as soon as one is found (the
+    check solves only ask whether the days are feasible). snapshot(callback, index) is called on every
+    improving solution. Use as a context manager around solver.solve so the plateau watchdog runs."""
+
+    def __init__(self, solver, gap=None, plateau=None, first_solution=False, verbose=True, snapshot=None):
         cp_model.CpSolverSolutionCallback.__init__(self)
+        self.snapshot = snapshot
         self.__solution_count = 0
+        self.solver = solver
+        self.gap = early_stop_gap if gap is None else gap
+        self.plateau = early_stop_plateau if plateau is None else plateau
+        self.first_solution = first_solution
+        self.verbose = verbose
+        self.objective = None
+        self.bound = None
+        self.last_improvement = None
+        self.stop_reason = ""
+        self.done = threading.Event()
+        solver.best_bound_callback = self.on_best_bound
+
+    def __enter__(self):
+        if self.plateau > 0:
+            threading.Thread(target=self._watch_plateau, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.done.set()
+        self.solver.best_bound_callback = None
 
     def on_solution_callback(self) -> None:
         self.__solution_count += 1
+        self.objective = self.objective_value
+        self.bound = self.best_objective_bound
+        self.last_improvement = time.monotonic()
+        if self.verbose:
+            print("Solution %i, time = %0.2f s, objective = %i" % (self.__solution_count - 1, self.wall_time, self.objective))
+        if self.snapshot:
+            self.snapshot(self, self.__solution_count - 1)
+        if self.first_solution:
+            self._stop("first solution")
+        else:
+            self._check_gap()
+
+    def on_best_bound(self, bound):
+        self.bound = bound
+        self._check_gap()
+
+    def _check_gap(self):
+        if self.gap <= 0 or self.objective is None or self.bound is None:
+            return
+        gap = abs(self.objective - self.bound) / max(1.0, abs(self.objective))
+        if gap <= self.gap:
+            self._stop(f"relative gap {gap:.2%} <= {self.gap:.2%}")
+
+    def _watch_plateau(self):
+        while not self.done.wait(0.25):
+            if self.last_improvement is not None and time.monotonic() - self.last_improvement >= self.plateau:
+                self._stop(f"no improvement for {self.plateau}s")
+                return
+
+    def _stop(self, reason):
+        if not self.stop_reason:
+            self.stop_reason = reason
+        self.solver.stop_search()
 
     def solution_count(self) -> int:
         return self.__solution_count
 
-def solve_shift_scheduling(output_proto: str, cost_literals, cost_coefficients, work, virtual_work, black_listed, employees, employees_stats, check_days, diagnostic=False):
-    """Solves the shift scheduling problem."""
+class BuildProfiler:
+    """Time and size of each constraint family added by build_model.
+
+    build_model calls mark(name) where a family starts; everything up to the next mark (or finish)
+    is charged to it: wall time, and the variables, constraints and objective terms it added.
+    With cprofile=True every family also gets its own cProfile run."""
+
+    def __init__(self, json_path="", cprofile=False, top=8):
+        self.json_path = json_path
+        self.cprofile = cprofile
+        self.top = top
+        self.families = []
+        self.profiles = {}
+
+    def start(self, model, cost_literals):
+        self.model = model
+        self.cost_literals = cost_literals
+        self.current = None
+
+    def _sizes(self):
+        proto = self.model.Proto()
+        return len(proto.variables), len(proto.constraints), len(self.cost_literals)
+
+    def mark(self, name):
+        self._close()
+        self.current = (name, time.perf_counter(), self._sizes())
+        if self.cprofile:
+            import cProfile
+            self.profiles[name] = cProfile.Profile()
+            self.profiles[name].enable()
+
+    def finish(self):
+        self._close()
+        self.current = None
+
+    def _close(self):
+        if self.current is None:
+            return
+        name, start, (variables, constraints, terms) = self.current
+        if self.cprofile:
+            self.profiles[name].disable()
+        seconds = time.perf_counter() - start
+        now_variables, now_constraints, now_terms = self._sizes()
+        self.families.append({"family": name, "seconds": round(seconds, 6),
+                              "variables": now_variables - variables, "constraints": now_constraints - constraints,
+                              "objective_terms": now_terms - terms})
+
+    def report(self):
+        total = sum(f["seconds"] for f in self.families) or 1
+        print(f"\n--- model build profile ---")
+        print(f"  {'family':22s} {'time (s)':>9s} {'share':>6s} {'vars':>8s} {'constraints':>11s} {'obj terms':>9s}")
+        for f in self.families:
+            print(f"  {f['family']:22s} {f['seconds']:9.4f} {100 * f['seconds'] / total:5.1f}% "
+                  f"{f['variables']:8d} {f['constraints']:11d} {f['objective_terms']:9d}")
+        print(f"  {'total':22s} {total:9.4f}        {sum(f['variables'] for f in self.families):8d} "
+              f"{sum(f['constraints'] for f in self.families):11d} {sum(f['objective_terms'] for f in self.families):9d}")
+        for name, profile in self.profiles.items():
+            import io
+            import pstats
+            print(f"\n  cProfile: {name}")
+            stream = io.StringIO()
+            pstats.Stats(profile, stream=stream).sort_stats("cumulative").print_stats(self.top)
+            print("\n".join("    " + line for line in stream.getvalue().splitlines() if line.strip()))
+        if self.json_path:
+            with open(self.json_path, "w") as f:
+                json.dump({"families": self.families, "total_seconds": round(total, 6)}, f, indent=2)
+            print(f"  build profile written to {self.json_path}")
+
+
+def build_model(cost_literals, cost_coefficients, work, virtual_work, black_listed, employees, employees_stats, check_days, diagnostic=False, profiler=None, ctx=None):
+    """Builds the shift scheduling model. Returns None if the input is invalid.
+
+    ctx is the SolveContext to build for (a strict one with the config.py values by default); its
+    violation registry is reset. A BuildProfiler passed as profiler records the cost of every constraint family."""
     num_employees = len(employees)
     num_shifts = len(shifts)
-    first_day_index = week.index(month_first_day)
+    cal = ShiftCalendar()
 
     model = cp_model.CpModel()
-    relaxations.clear()
+    ctx = ctx or SolveContext()
+    ctx.reset()
 
     if not validate_input(employees):
-        return
+        return None
+    if profiler:
+        profiler.start(model, cost_literals)
+    family = profiler.mark if profiler else lambda name: None
 ########################################################################
 # Basic Rules
 ########################################################################
+    family("basic rules")
+    # in a sparse model the cells that can never be assigned (shift outside the employee's level,
+    # shift not required on a covered day, "N" slot while hard rules are strict) are the constant
+    # False instead of a variable, and live() drops them from every later sum
+    covered = [len(check_days) == 0 or d in check_days for d in range(month_days)]
     for e in range(num_employees):
+        prefs = employees[e].prefs
         for s in range(num_shifts):
             for d in range(month_days):
-                work[e, s, d] = model.new_bool_var(f"work{e}_{s}_{d}")
-                black_listed[e, s, d] = False
+                dead = ctx.sparse_model and (not can_do_shift(employees, e, s)
+                                         or (covered[d] and not cal.required[d, s])
+                                         or (not hard_rules_relaxed(ctx) and prefs[d, cal.day_part[s]] == PREF_N))
+                work[e, s, d] = False if dead else model.new_bool_var(f"work{e}_{s}_{d}")
+                black_listed[e, s, d] = dead
 
     for e in range(num_employees):
         for d in range(month_days):
-            virtual_work[e,d] = model.new_bool_var(f"virtual_work{e}_{d}")
+            dead = ctx.sparse_model and ((covered[d] and not cal.has_virtual_reserve[d])
+                                     or (not hard_rules_relaxed(ctx) and (employees[e].prefs[d] == PREF_N).any()))
+            virtual_work[e,d] = False if dead else model.new_bool_var(f"virtual_work{e}_{d}")
 
     #employee works at d -  max one shift per day
     for e in range(num_employees):
         for d in range(month_days):
-            day_shifts = [work[e, s, d] for s in range(num_shifts)]
+            day_shifts = live([work[e, s, d] for s in range(num_shifts)])
             employees_stats[e].works_at_day[d] = model.new_bool_var(f"e_{e}_works_at_{d}")
             day_shifts.append(~employees_stats[e].works_at_day[d])
             model.add_exactly_one(day_shifts)
             model.add_at_most_one([employees_stats[e].works_at_day[d], virtual_work[e,d]])
 
     # limit the cost of shifts
+    family("salary cap")
     for e in range(num_employees):
         weights = []
         costs = []
         max_cost = salaries["max"]  - 10 * get_employee_gift_shifts(employees,e)
         for d in range(month_days):
-            if is_public_holiday(d):
-                day_cost = salaries["holiday"]
-            elif is_sunday(d):
-                day_cost = salaries["Su"]
-            elif is_saturday(d):
-                day_cost = salaries["Sa"]
-            else:
-                day_cost = salaries["weekday"]
-            for s in range(num_shifts):
-                weights.append(work[e, s, d])
+            day_cost = int(cal.day_cost[d])
+            for lit in live([work[e, s, d] for s in range(num_shifts)] + [virtual_work[e, d]]):
+                weights.append(lit)
                 costs.append(day_cost)
-            weights.append(virtual_work[e, d])
-            costs.append(day_cost)
         weighted_sum = sum(weights[i] * costs[i] for i in range(len(costs)))
-        if RELAX_HARD:
-            v = register_violation(model, cost_literals, cost_coefficients,
-                                   f"{get_employee_name(employees,e)}: salary cap ({max_cost}) exceeded", 2 * RELAX_PENALTY)
+        if hard_rules_relaxed(ctx):
+            v = register_violation(ctx, model, cost_literals, cost_coefficients,
+                                   f"{get_employee_name(employees,e)}: salary cap ({max_cost}) exceeded", 2 * RELAX_PENALTY,
+                                   guard="salary cap")
             model.Add(weighted_sum <= max_cost).OnlyEnforceIf(~v)
         else:
             model.Add(weighted_sum <= max_cost)
 
     #not close shifts
+    family("close shifts")
+    # "clause" only forces the penalty literal on (the objective keeps it off otherwise): one clause
+    # instead of a reified BoolAnd / BoolOr pair
+    close_clauses = ctx.close_encoding == "clause"
     for e in range(num_employees):
-        for index, value in enumerate(close_shift_penalties):
+        for index, value in enumerate(ctx.close_shift_penalties):
             for d in range(month_days - index - 1):
                 close_work_var = model.NewBoolVar(f'close_work_{e}_{d}_{index}')
                 work_list = [employees_stats[e].works_at_day[d], employees_stats[e].works_at_day[d + index  + 1]]
@@ -582,18 +1018,47 @@ def solve_shift_scheduling(output_proto: str, cost_literals, cost_coefficients,
                     work_list.append(~employees_stats[e].works_at_day[i])
                     reverse_work_list.append(employees_stats[e].works_at_day[i])
 
-                model.AddBoolAnd(work_list).OnlyEnforceIf(close_work_var)
-                model.AddBoolOr(reverse_work_list).OnlyEnforceIf(~close_work_var)
+                if close_clauses:
+                    model.add_bool_or(reverse_work_list + [close_work_var])
+                else:
+                    model.AddBoolAnd(work_list).OnlyEnforceIf(close_work_var)
+                    model.AddBoolOr(reverse_work_list).OnlyEnforceIf(~close_work_var)
                 cost_literals.append(close_work_var)
                 cost_coefficients.append(value)
                 employees_stats[e].add_var_weight(close_work_var, value)
 
     #not close nights <= check this if it can be relaxed
+    family("close nights")
     for e in range(num_employees):
-        for d in range(month_days - close_nights_range):
+        if close_clauses:
+            # one shared "works a night on d" literal per day, and per window a clause for each pair of
+            # its days; windows without any possible night are skipped
+            nights = []
+            for d in range(month_days):
+                night_works = live([work[e, s, d] for s in cal.night_shifts])
+                if night_works:
+                    night = model.new_bool_var(f'works_night_{e}_{d}')
+                    model.add(night == sum(night_works))
+                    nights.append(night)
+                else:
+                    nights.append(False)
+            for d in range(month_days - ctx.close_nights_range):
+                window = live(nights[d:d + ctx.close_nights_range + 1])
+                if len(window) < 2:
+                    continue
+                close_var = f'close_nights_{e}_{d}'
+                employees_stats[e].count_vars[close_var] = model.NewBoolVar(close_var)
+                for i in range(len(window)):
+                    for j in range(i + 1, len(window)):
+                        model.add_bool_or([~window[i], ~window[j], employees_stats[e].count_vars[close_var]])
+                cost_literals.append(employees_stats[e].count_vars[close_var])
+                cost_coefficients.append(ctx.close_nights_penalty)
+                employees_stats[e].add_var_weight(employees_stats[e].count_vars[close_var], ctx.close_nights_penalty)
+            continue
+        for d in range(month_days - ctx.close_nights_range):
             close_count = f'close_nights_count_{e}_{d}'
             employees_stats[e].count_vars[close_count] = model.new_int_var(0, get_employee_max_shifts(employees,e),close_count)
-            model.add(employees_stats[e].count_vars[close_count] == sum(work[e, s, d_] for d_ in range(d, d + close_nights_range + 1) for s in get_night_shifts()))
+            model.add(employees_stats[e].count_vars[close_count] == sum(live([work[e, s, d_] for d_ in range(d, d + ctx.close_nights_range + 1) for s in cal.night_shifts])))
             close_var = f'close_nights_{e}_{d}'
             employees_stats[e].count_vars[close_var] = model.NewBoolVar(close_var)
             model.add(employees_stats[e].count_vars[close_count] > 1).only_enforce_if(
@@ -601,14 +1066,17 @@ def solve_shift_scheduling(output_proto: str, cost_literals, cost_coefficients,
             model.add(employees_stats[e].count_vars[close_count] <= 1).only_enforce_if(
                 ~employees_stats[e].count_vars[close_var])
             cost_literals.append(employees_stats[e].count_vars[close_var])
-            cost_coefficients.append(close_nights_penalty)
-            employees_stats[e].add_var_weight(employees_stats[e].count_vars[close_var], close_nights_penalty)
+            cost_coefficients.append(ctx.close_nights_penalty)
+            employees_stats[e].add_var_weight(employees_stats[e].count_vars[close_var], ctx.close_nights_penalty)
 
     #exclude shifts based to employee capability
+    family("capability")
     for e in range(num_employees):
         for s in range(num_shifts):
             for d in range(month_days):
-                if shifts[s] not in get_employee_capable_shifts(employees,e):
+                if work[e, s, d] is False:
+                    continue
+                if not can_do_shift(employees, e, s):
                     model.add(work[e, s, d] == False)
                     black_listed[e, s, d] = True
                 if get_employee_level(employees, e) in level_penalties:
@@ -620,145 +1088,166 @@ def solve_shift_scheduling(output_proto: str, cost_literals, cost_coefficients,
                         employees_stats[e].add_var_weight(penalty_shift, level_penalties[get_employee_level(employees, e)][shifts[s]])
 
     #force all shifts to be covered
+    family("coverage")
     total_shifts = 0
     for d in range(month_days):
         if len(check_days) > 0 and not d in check_days:
             continue
 
-        if is_holiday(d):
-            day_shifts = set(holiday_shifts)
-        else:
-            day_shifts = set(week_day_shifts)
-        day_shifts = day_shifts.intersection(set(shift_groups[(d + month_starts_with_internal) % len(shift_groups)]))
-
         for s in range(num_shifts):
-            works = [work[e, s, d] for e in range(num_employees)]
-            if shifts[s] in day_shifts:
-                if RELAX_HARD:
-                    v = register_violation(model, cost_literals, cost_coefficients,
-                                           f"shift {shifts[s]} on day {d+1} LEFT UNCOVERED", 5 * RELAX_PENALTY)
-                    model.add_exactly_one(works + [v])
+            works = live([work[e, s, d] for e in range(num_employees)])
+            if cal.required[d, s]:
+                if hard_rules_relaxed(ctx):
+                    v = register_violation(ctx, model, cost_literals, cost_coefficients,
+                                           f"shift {shifts[s]} on day {d+1} LEFT UNCOVERED", 5 * RELAX_PENALTY,
+                                           guard=f"coverage of day {d+1}")
+                    if ctx.assume_hard:
+                        model.add_at_most_one(works)
+                        model.add_bool_or(works).only_enforce_if(~v)
+                    else:
+                        model.add_exactly_one(works + [v])
                 else:
                     model.add_exactly_one(works)
                 total_shifts += 1
             else:
+                for w in works:
+                    model.add(w == False)
                 for e in range(num_employees):
-                    model.add(work[e, s, d] == False)
                     black_listed[e, s, d] = True
 
     #force virtual shifts to be covered
+    family("virtual coverage")
     for d in range(month_days):
         if len(check_days) > 0 and not d in check_days:
             continue
 
-        if (d + month_starts_with_internal) % len(shift_groups) == 1:
-            vw = [virtual_work[e, d] for e in range(num_employees)]
-            if RELAX_HARD:
-                v = register_violation(model, cost_literals, cost_coefficients,
-                                       f"virtual reserve on day {d+1} LEFT UNCOVERED", 5 * RELAX_PENALTY)
-                model.add_exactly_one(vw + [v])
+        if cal.has_virtual_reserve[d]:
+            vw = live([virtual_work[e, d] for e in range(num_employees)])
+            if hard_rules_relaxed(ctx):
+                v = register_violation(ctx, model, cost_literals, cost_coefficients,
+                                       f"virtual reserve on day {d+1} LEFT UNCOVERED", 5 * RELAX_PENALTY,
+                                       guard=f"coverage of day {d+1}")
+                if ctx.assume_hard:
+                    model.add_at_most_one(vw)
+                    model.add_bool_or(vw).only_enforce_if(~v)
+                else:
+                    model.add_exactly_one(vw + [v])
             else:
                 model.add_exactly_one(vw)
         else:
-            for e in range(num_employees):
-                model.add(virtual_work[e, d] == False)
+            for vw in live([virtual_work[e, d] for e in range(num_employees)]):
+                model.add(vw == False)
 
     night_input = {
         "prefix": "night",
         "applicable": lambda e: can_do_nights(employees, e) and get_employee_max_shifts(employees, e) > 0,
-        "lambda": lambda e, s, d: is_night_shift(s),
+        "lambda": lambda e, s, d: cal.is_night[s],
         "index": lambda e: get_employee_extra_nights(employees, e),
-        "limits": night_limits
+        "limits": ctx.night_limits
     }
 
     holiday_input = {
         "prefix": "holiday",
         "applicable": lambda e: get_employee_max_shifts(employees, e) > 0,
-        "lambda": lambda e, s, d: is_holiday(d),
+        "lambda": lambda e, s, d: cal.is_holiday[d],
         "index": lambda e: 0,
-        "limits": holiday_limits
+        "limits": ctx.holiday_limits
     }
 
     internal_input = {
         "prefix": "internal",
         "applicable": lambda e: get_employee_max_shifts(employees, e) > 0 and can_do_internal(employees,e) and can_do_external(employees, e),
-        "lambda": lambda e, s, d: is_internal(s),
+        "lambda": lambda e, s, d: cal.is_internal[s],
         "index": lambda e: 2 if get_employee_level(employees, e) == "D" else 1 if get_employee_level(employees,e) == "C" else 0,
-        "limits": internal_limits
+        "limits": ctx.internal_limits
     }
 
     virtual_input = {
         "prefix": "virtual",
         "applicable": lambda ee: True,
-        "set_lambda": lambda ee: [virtual_work[ee, dd] for dd in range(month_days)],
+        "set_lambda": lambda ee: live([virtual_work[ee, dd] for dd in range(month_days)]),
         "max_value": 2,
         "index": lambda ee: 1 if get_employee_virtual_shifts(employees, ee) > 0 else 0,
-        "limits": virtual_limits,
-        "total_lambda": lambda e, s, d: is_night_shift(s),
+        "limits": ctx.virtual_limits,
+        "total_lambda": lambda e, s, d: cal.is_night[s],
     }
 
-    add_constraints(model, work, night_input, num_employees, num_shifts, cost_coefficients, cost_literals,employees, employees_stats)
-    add_constraints(model, work, holiday_input, num_employees, num_shifts, cost_coefficients, cost_literals, employees, employees_stats)
-    add_constraints(model, work, virtual_input, num_employees, num_shifts, cost_coefficients, cost_literals, employees, employees_stats)
-    add_constraints(model, work, internal_input, num_employees, num_shifts, cost_coefficients, cost_literals, employees, employees_stats)
+    family("night limits")
+    add_constraints(ctx, model, work, night_input, num_employees, num_shifts, cost_coefficients, cost_literals,employees, employees_stats)
+    family("holiday limits")
+    add_constraints(ctx, model, work, holiday_input, num_employees, num_shifts, cost_coefficients, cost_literals, employees, employees_stats)
+    family("virtual limits")
+    add_constraints(ctx, model, work, virtual_input, num_employees, num_shifts, cost_coefficients, cost_literals, employees, employees_stats)
+    family("internal limits")
+    add_constraints(ctx, model, work, internal_input, num_employees, num_shifts, cost_coefficients, cost_literals, employees, employees_stats)
     
-    for grp in exclusive_groups:
+    family("exclusive groups")
+    for grp in ctx.exclusive_groups:
         if not diagnostic:
             print(f"exclusive group {[get_employee_name(employees,e) for e in grp]}")
         for d in range(month_days):
             for dp_idx in range(len(day_parts)):
                 grp_works = []
-                for s in get_day_part_shifts(dp_idx):
+                for s in cal.day_part_shifts[dp_idx]:
                     for e in grp:
-                        grp_works.append(work[e, s, d])
-                if RELAX_HARD:
+                        grp_works.extend(live([work[e, s, d]]))
+                if hard_rules_relaxed(ctx):
                     grp_names = [get_employee_name(employees, e) for e in grp]
-                    v = register_violation(model, cost_literals, cost_coefficients,
-                                           f"exclusive group {grp_names} share day {d+1} {day_part_name(dp_idx)}")
+                    v = register_violation(ctx, model, cost_literals, cost_coefficients,
+                                           f"exclusive group {grp_names} share day {d+1} {day_part_name(dp_idx)}",
+                                           guard="exclusive_groups")
                     model.add(sum(grp_works) <= 1).OnlyEnforceIf(~v)
                 else:
                     model.add_at_most_one(grp_works)
                 
     #positives - negatives
+    family("preferences")
     for e in range(num_employees):
         pos_prefs = get_pos_prefs(employees,e)
         neg_prefs = get_neg_prefs(employees,e)
         negs = get_neg(employees,e)
         pos = get_pos(employees,e)
+        avail_slots = (3*month_days - negs - pos)
+        weight = int(round(ctx.pref_factor * (avail_slots - pos_prefs - neg_prefs) / (avail_slots + 1)))
 
         for d in range(month_days):
             virtual_negative_added = False
             for dp_idx in range(len(day_parts)):
-                employee_works = [work[e, s, d] for s in get_day_part_shifts(dp_idx)]
+                employee_works = live([work[e, s, d] for s in cal.day_part_shifts[dp_idx]])
                 slot_pref = get_employee_preference(employees,e, d, dp_idx)
 
                 if slot_pref == "P":
-                    if RELAX_HARD:
-                        v = register_violation(model, cost_literals, cost_coefficients,
-                                               f"{get_employee_name(employees,e)}: must-work (P) NOT honored, day {d+1} {day_part_name(dp_idx)}", 3 * RELAX_PENALTY)
-                        model.add_exactly_one(employee_works + [v])
+                    if hard_rules_relaxed(ctx):
+                        v = register_violation(ctx, model, cost_literals, cost_coefficients,
+                                               f"{get_employee_name(employees,e)}: must-work (P) NOT honored, day {d+1} {day_part_name(dp_idx)}", 3 * RELAX_PENALTY,
+                                               guard="must-work (P) preferences")
+                        if ctx.assume_hard:
+                            model.add_bool_or(employee_works).only_enforce_if(~v)
+                        else:
+                            model.add_exactly_one(employee_works + [v])
                     else:
                         model.add_exactly_one(employee_works)
                     can_do = False
-                    for s in get_day_part_shifts(dp_idx):
+                    for s in cal.day_part_shifts[dp_idx]:
                         if not black_listed[e, s, d]:
                             can_do = True
                     if not can_do:
                         print(f'CAN DO ERROR e {e} s {s} d {d}')
 
                 if slot_pref == "N":
-                    if RELAX_HARD:
-                        v = register_violation(model, cost_literals, cost_coefficients,
-                                               f"{get_employee_name(employees,e)}: must-not-work (N) VIOLATED, day {d+1} {day_part_name(dp_idx)}", 3 * RELAX_PENALTY)
+                    if hard_rules_relaxed(ctx):
+                        v = register_violation(ctx, model, cost_literals, cost_coefficients,
+                                               f"{get_employee_name(employees,e)}: must-not-work (N) VIOLATED, day {d+1} {day_part_name(dp_idx)}", 3 * RELAX_PENALTY,
+                                               guard="must-not-work (N) preferences")
                         for w in employee_works:
                             model.add(w == 0).OnlyEnforceIf(~v)
-                        if not virtual_negative_added:
+                        if not virtual_negative_added and virtual_work[e, d] is not False:
                             model.add(virtual_work[e, d] == False).OnlyEnforceIf(~v)
                             virtual_negative_added = True
                     else:
                         for w in employee_works:
                             model.add(w == 0)
-                        if not virtual_negative_added:
+                        if not virtual_negative_added and virtual_work[e, d] is not False:
                             model.add(virtual_work[e, d] == False)
                             virtual_negative_added = True
 
@@ -766,9 +1255,6 @@ def solve_shift_scheduling(output_proto: str, cost_literals, cost_coefficients,
                     name = f"worked_pref_{e}_{d}_{dp_idx}"
                     worked = model.new_bool_var(name)
 
-
-                    avail_slots = (3*month_days - negs - pos)
-                    weight = int(round(pref_factor * (avail_slots - pos_prefs - neg_prefs) / (avail_slots + 1)))
                     if slot_pref == "WN":
                         employee_works.append(~worked)
                     else:
@@ -780,19 +1266,34 @@ def solve_shift_scheduling(output_proto: str, cost_literals, cost_coefficients,
 
 
     #hot periods
+    family("hot periods")
     for e in range(num_employees):
         e_hot_periods=[]
-        for h in range(len(hot_periods)):
+        for h in range(len(ctx.hot_periods)):
             hot_works=[]
-            for d1 in hot_periods[h]:
+            for d1 in ctx.hot_periods[h]:
                 d = d1 - 1
-                for s in range(num_shifts):
-                    hot_works.append(work[e, s, d])
+                hot_works.extend(live([work[e, s, d] for s in range(num_shifts)]))
             hot_work_var = model.new_bool_var(f"hot_work_e_{e}_h_{h}")
             model.add(sum(hot_works) > 0).only_enforce_if(hot_work_var)
             model.add(sum(hot_works) == 0).only_enforce_if(~hot_work_var)
             e_hot_periods.append(hot_work_var)
-        model.add_at_most_one(e_hot_periods)
+        # guarded for the diagnosis only: the best-effort solve keeps hot periods hard, as it always has
+        if ctx.assume_hard:
+            v = register_violation(ctx, model, cost_literals, cost_coefficients,
+                                   f"{get_employee_name(employees,e)}: works in more than one hot period",
+                                   guard="hot_periods")
+            model.add(sum(e_hot_periods) <= 1).only_enforce_if(~v)
+        else:
+            model.add_at_most_one(e_hot_periods)
+
+    # the assumption guards are per employee, so dropping one of them makes the employees unequal
+    family("symmetry breaking")
+    if ctx.symmetry_breaking and not ctx.assume_hard:
+        groups = interchangeable_employees(employees, ctx)
+        if groups and len(check_days) == 0 and not diagnostic:
+            print(f"symmetry breaking: {[[get_employee_name(employees, e) for e in grp] for grp in groups]}")
+        add_symmetry_breaking(model, groups, work, virtual_work, num_shifts)
 
 
     avg_shifts = total_shifts // len(employees)
@@ -803,68 +1304,119 @@ def solve_shift_scheduling(output_proto: str, cost_literals, cost_coefficients,
         print("total shifts " + str(total_shifts))
 
     # Objective
+    family("objective")
     model.minimize(
         #sum(cost_literals[i] * cost_coefficients[i] for i in range(len(cost_literals)))
         cp_model.LinearExpr.weighted_sum(cost_literals, cost_coefficients)
         #+
         #sum(obj_int_vars[i] * obj_int_coeffs[i] for i in range(len(obj_int_vars)))
     )
+    if profiler:
+        profiler.finish()
+    return model
+
+
+def solver_profile_name(kind):
+    """Profile name for a kind of solve ("main", "diagnostic" or "check"): the matching flag, else config.py."""
+    flag, default = {
+        "main": (_MAIN_PROFILE, main_solve_profile),
+        "diagnostic": (_DIAGNOSTIC_PROFILE, diagnostic_solve_profile),
+        "check": (_CHECK_PROFILE, check_solve_profile),
+    }[kind]
+    if flags.FLAGS.is_parsed() and flag.value:
+        return flag.value
+    return default
+
+
+def apply_solver_profile(solver, kind, ctx=None):
+    """Load the solver_profiles entry for this kind of solve into the solver parameters. Returns its name.
+
+    The profile (and its parameters) come from ctx when given, else from the flags and config.py."""
+    profiles = ctx.solver_profiles if ctx else solver_profiles
+    name = ctx.profile_name(kind) if ctx else solver_profile_name(kind)
+    lines = []
+    for field, value in profiles[name].items():
+        if isinstance(value, bool):
+            value = "true" if value else "false"
+        lines.append(f"{field}: {value}")
+    if not solver.parameters.merge_text_format("\n".join(lines)):
+        raise ValueError(f"solver profile '{name}' has an invalid parameter: {profiles[name]}")
+    return name
+
+
+def solve_shift_scheduling(output_proto: str, cost_literals, cost_coefficients, work, virtual_work, black_listed, employees, employees_stats, check_days, diagnostic=False, solver_workers=0, cache_key="", hint=None, schedule_path="", incremental=None, build_profiler=None, snapshot=None, export_path="", report_path="", ctx=None):
+    """Solves the shift scheduling problem with the options and hard-rule mode of ctx (see SolveContext)."""
+    ctx = caller_ctx = ctx or SolveContext()
+    if (incremental or hint) and ctx.symmetry_breaking:
+        # pinned to the published schedule, equal employees are no longer interchangeable; a hint
+        # may put them in the opposite order and would then be infeasible
+        ctx = SolveContext(ctx.mode, **dict(ctx.options(), symmetry_breaking=False))
+    model = build_model(cost_literals, cost_coefficients, work, virtual_work, black_listed, employees,
+                        employees_stats, check_days, diagnostic, build_profiler, ctx)
+    if model is None:
+        return
+    if build_profiler:
+        build_profiler.report()
 
-    if output_proto:
-        print(f"Writing proto to {output_proto}")
-        with open(output_proto, "w") as text_file:
-            text_file.write(str(model))
+    if hint:
+        add_schedule_hint(model, hint, work, virtual_work, employees)
+    if incremental:
+        pin_to_schedule(model, *incremental, work, virtual_work, employees, cost_literals, cost_coefficients,
+                        ctx.incremental_change_penalty)
 
-    with open("model.pbtxt", "w") as f:
-        f.write(str(model.Proto()))
+    if output_proto:
+        export_model(model, output_proto)
 
     # Solve the model.
     solver = cp_model.CpSolver()
     if diagnostic:
-        solver.parameters.max_time_in_seconds = diagnostic_solve_time
+        profile = apply_solver_profile(solver, "diagnostic", ctx)
+        solver.parameters.max_time_in_seconds = ctx.diagnostic_solve_time
+    elif incremental:
+        profile = apply_solver_profile(solver, "main", ctx)
+        solver.parameters.max_time_in_seconds = ctx.incremental_solve_time
     elif len(check_days) == 0:
-        solver.parameters.max_time_in_seconds = max_solve_time
+        profile = apply_solver_profile(solver, "main", ctx)
+        solver.parameters.max_time_in_seconds = ctx.max_solve_time
     else:
-        solver.parameters.max_time_in_seconds = max_solve_time_check
-    #solver.parameters.log_search_progress = True
-    #solver.parameters.enumerate_all_solutions = True
-    #solver.parameters.num_search_workers = 8
-    #solver.parameters.log_to_stdout = True
-    #solver.parameters.linearization_level = 0
-    #solver.parameters.cp_model_presolve = True
-    #solver.parameters.cp_model_probing_level = 0
-    #
-    # solver.parameters.log_search_progress = True
-    # solver.parameters.cp_model_presolve = True
-    # #solver.parameters.compute_intermediate_stats = True
-    # solver.parameters.log_to_stdout = True
-    #
-    #
-    # print(model.validate())
-
-    #solver.parameters.log_to_stdout = True
+        profile = apply_solver_profile(solver, "check", ctx)
+        solver.parameters.max_time_in_seconds = ctx.max_solve_time_check
+    if solver_workers > 0:
+        solver.parameters.num_workers = solver_workers
     #model.Proto().ClearField("solution_hint")
     #print(model.Proto())
 
-    solution_printer = cp_model.ObjectiveSolutionPrinter()  if (len(check_days) == 0 and not diagnostic) else MuteSolutionPrinter()
-    status = solver.solve(model, solution_printer)
+    main_solve = len(check_days) == 0 and not diagnostic
+    with EarlyStopPrinter(solver, ctx.early_stop_gap, ctx.early_stop_plateau, first_solution=not main_solve, verbose=main_solve,
+                          snapshot=snapshot if main_solve else None) as solution_printer:
+        status = solver.solve(model, solution_printer)
+    ctx.status = caller_ctx.status = status
 
     if len(check_days) == 0 and not diagnostic:
         print("Status = %s" % solver.status_name(status))
 
         print("Statistics")
+        print("  - profile   : %s (%s workers)" % (profile, solver.parameters.num_workers or "all"))
         print("  - conflicts : %i" % solver.num_conflicts)
         print("  - branches  : %i" % solver.num_branches)
         print("  - wall time : %f s" % solver.wall_time)
         print("  - number of solutions found: %i" % solution_printer.solution_count())
+        if solution_printer.stop_reason:
+            print("  - stopped early: %s" % solution_printer.stop_reason)
 
     # Print solution.
     if status == cp_model.OPTIMAL or status == cp_model.FEASIBLE:
-        if RELAX_HARD and not diagnostic:
-            print_broken_rules(solver)
+        if ctx.relax_hard and not diagnostic:
+            print_broken_rules(ctx, solver)
         if len(check_days) == 0 and not diagnostic:
             print("SOLVED")
-            print_solution(solver, status, work, virtual_work, employees, employees_stats)
+            if cache_key and not ctx.relax_hard:
+                store_cached_schedule(cache_key, model, solver, status, work, virtual_work, employees_stats)
+            if schedule_path and not ctx.relax_hard:
+                save_schedule(schedule_path, solver, work, virtual_work, employees)
+            if export_path:
+                export_schedule(export_path, solver, work, virtual_work, employees, employees_stats)
+            print_solution(solver, status, work, virtual_work, employees, employees_stats, html_path=report_path)
         return True
     else:
         if not diagnostic:
@@ -881,44 +1433,500 @@ def solve_shift_scheduling(output_proto: str, cost_literals, cost_coefficients,
         return False
 
 
-def add_constraints(model, work, specific_input, num_employees, num_shifts, cost_coefficients, cost_literals, employees, employees_stats):
+def previous_input_path(schedule_path):
+    return os.path.splitext(schedule_path)[0] + ".input.csv"
+
+
+def save_schedule(path, solver, work, virtual_work, employees):
+    """Write the assignments of a solve as employee,day,weekday,shift rows (shift VIRTUAL for reserves).
+
+    The input csv is copied next to it (see previous_input_path) for --incremental_from."""
+    shutil.copyfile(filename, previous_input_path(path))
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["employee", "day", "weekday", "shift"])
+        writer.writerows(schedule_rows(solver, work, virtual_work, employees))
+    print(f"schedule written to {path}")
+
+
+def schedule_rows(solver, work, virtual_work, employees):
+    """[employee, day, weekday, shift] for every assignment of a solve (or of a solution callback)."""
+    cal = ShiftCalendar()
+    rows = []
+    for d in range(month_days):
+        for s in range(len(shifts)):
+            for e in range(len(employees)):
+                if solver.boolean_value(work[e, s, d]):
+                    rows.append([get_employee_name(employees, e), d + 1, week[cal.weekday[d]], shifts[s]])
+        for e in range(len(employees)):
+            if solver.boolean_value(virtual_work[e, d]):
+                rows.append([get_employee_name(employees, e), d + 1, week[cal.weekday[d]], "VIRTUAL"])
+    return rows
+
+
+class SnapshotWriter:
+    """Write every improving solution of a running solve to directory, each file replaced atomically.
+
+    best.csv has the save_schedule format (with best.input.csv next to it, so it also works with
+    --hint_from / --incremental_from), best.json the same assignments plus objective and bound,
+    best.html (with html=True) the full report; progress.csv gets one line per solution."""
+    def __init__(self, directory, work, virtual_work, employees, employees_stats, html=False):
+        self.directory = directory
+        self.work = work
+        self.virtual_work = virtual_work
+        self.employees = employees
+        self.employees_stats = employees_stats
+        self.html = html
+        os.makedirs(directory, exist_ok=True)
+        shutil.copyfile(filename, previous_input_path(os.path.join(directory, "best.csv")))
+        with open(os.path.join(directory, "progress.csv"), "w", newline="") as f:
+            csv.writer(f).writerow(["solution", "wall_time", "objective", "best_bound"])
+
+    def __call__(self, callback, count):
+        rows = schedule_rows(callback, self.work, self.virtual_work, self.employees)
+        with atomic_open(os.path.join(self.directory, "best.csv"), newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["employee", "day", "weekday", "shift"])
+            writer.writerows(rows)
+        with atomic_open(os.path.join(self.directory, "best.json")) as f:
+            json.dump({"solution": count, "wall_time": round(callback.wall_time, 3),
+                       "objective": callback.objective_value, "best_bound": callback.best_objective_bound,
+                       "assignments": rows}, f)
+        if self.html:
+            print_solution(callback, cp_model.FEASIBLE, self.work, self.virtual_work, self.employees,
+                           self.employees_stats, html_path=os.path.join(self.directory, "best.html"))
+        with open(os.path.join(self.directory, "progress.csv"), "a", newline="") as f:
+            csv.writer(f).writerow([count, round(callback.wall_time, 3), callback.objective_value,
+                                    callback.best_objective_bound])
+
+
+def read_schedule(path, align_weekdays=False, day_offset=0):
+    """Read a save_schedule csv as a set of (employee name, day index of this month, shift name).
+
+    With align_weekdays the days move by at most 3 so each lands on the same weekday in this month;
+    day_offset is added on top. Days that fall outside the month are dropped."""
+    with open(path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    shift_by = day_offset
+    if align_weekdays and rows:
+        old_first = (week.index(rows[0]["weekday"]) - (int(rows[0]["day"]) - 1)) % len(week)
+        shift_by += (old_first - week.index(month_first_day) + 3) % len(week) - 3
+    schedule = set()
+    for row in rows:
+        d = int(row["day"]) - 1 + shift_by
+        if 0 <= d < month_days:
+            schedule.add((row["employee"], d, row["shift"]))
+    return schedule
+
+
+def schedule_cells(schedule, employees):
+    """The work (e, s, d) and virtual_work (e, d) keys assigned in `schedule` (see read_schedule)."""
+    index_of = {get_employee_name(employees, e): e for e in range(len(employees))}
+    assigned = set()
+    for name, d, shift in schedule:
+        if name not in index_of:
+            continue
+        if shift == "VIRTUAL":
+            assigned.add((index_of[name], d))
+        elif shift in shifts:
+            assigned.add((index_of[name], shifts.index(shift), d))
+    return assigned
+
+
+def add_schedule_hint(model, schedule, work, virtual_work, employees):
+    """Hint every live work / virtual_work variable with its value in `schedule` (see read_schedule)."""
+    assigned = schedule_cells(schedule, employees)
+    for key, var in list(work.items()) + list(virtual_work.items()):
+        if var is not False:
+            model.add_hint(var, key in assigned)
+
+
+def pin_to_schedule(model, schedule, free_employees, free_days, work, virtual_work, employees, cost_literals, cost_coefficients, change_penalty=incremental_change_penalty):
+    """Fix every cell outside the free employees / days to its value in `schedule`.
+
+    Inside the free region each cell that differs from `schedule` costs change_penalty."""
+    assigned = schedule_cells(schedule, employees)
+    for key, var in list(work.items()) + list(virtual_work.items()):
+        if var is False:
+            continue
+        published = key in assigned
+        if key[0] in free_employees or key[-1] in free_days:
+            cost_literals.append(~var if published else var)
+            cost_coefficients.append(change_penalty)
+            model.add_hint(var, published)
+        else:
+            model.add(var == published)
+    model.minimize(cp_model.LinearExpr.weighted_sum(cost_literals, cost_coefficients))
+
+
+def diff_inputs(old_employees, employees):
+    """Compare two parsed inputs by employee name.
+
+    Returns (indexes of new or re-parameterised employees, days whose preferences changed, removed names)."""
+    old_by_name = {emp.name: emp for emp in old_employees}
+    changed_employees = set()
+    changed_days = set()
+    for e, emp in enumerate(employees):
+        old = old_by_name.get(emp.name)
+        if old is None or (old.level, old.min_shifts, old.max_shifts, old.extra_nights, old.virtual_shifts, old.gift_shifts) != \
+                (emp.level, emp.min_shifts, emp.max_shifts, emp.extra_nights, emp.virtual_shifts, emp.gift_shifts):
+            changed_employees.add(e)
+        elif old.prefs.shape == emp.prefs.shape:
+            changed_days.update(numpy.flatnonzero((old.prefs != emp.prefs).any(axis=1)).tolist())
+        else:
+            changed_employees.add(e)
+    names = {emp.name for emp in employees}
+    removed = [name for name in old_by_name if name not in names]
+    return changed_employees, changed_days, removed
+
+
+def solve_incremental(list_data, schedule_path, save_path="", export_path="", ctx=None):
+    """Re-solve only what changed since `schedule_path` was published, widening the region until feasible.
+
+    Returns False without solving when the schedule or the input csv saved next to it cannot be read."""
+    try:
+        old_data = read_input(previous_input_path(schedule_path))
+        schedule = read_schedule(schedule_path)
+    except (OSError, ValueError) as e:
+        # only schedules written by save_schedule / SnapshotWriter have the .input.csv next to them
+        print(f"cannot re-solve incrementally from {schedule_path}: {e}")
+        return False
+    old_employees = []
+    format_input(old_data, old_employees, [])
+    employees = []
+    format_input(list_data, employees, [])
+
+    free_employees, changed_days, removed = diff_inputs(old_employees, employees)
+    # the published shifts of removed employees have to be handed to someone else
+    changed_days.update(d for name, d, shift in schedule if name in removed)
+
+    ctx = ctx or SolveContext()
+    radius = ctx.incremental_radius
+    while True:
+        free_days = {d + k for d in changed_days for k in range(-radius, radius + 1) if 0 <= d + k < month_days}
+        print(f"\nincremental re-solve: {len(free_employees)} changed employee(s), "
+              f"free days {[d + 1 for d in sorted(free_days)]}")
+        cost_literals = []
+        cost_coefficients = []
+        work = {}
+        virtual_work = {}
+        black_listed = {}
+        employees = []
+        employees_stats = []
+        format_input(list_data, employees, employees_stats)
+        if solve_shift_scheduling("", cost_literals, cost_coefficients, work, virtual_work, black_listed, employees,
+                                  employees_stats, [], schedule_path=save_path, export_path=export_path,
+                                  incremental=(schedule, free_employees, free_days), ctx=ctx):
+            return True
+        if len(free_days) == month_days:
+            return False
+        # widen: more days around each change, or every day if only employee parameters changed
+        radius = 2 * radius + 1
+        if not changed_days:
+            changed_days = set(range(month_days))
+
+
+def export_model(model, output_proto):
+    """Write the model proto to a per-run unique file derived from output_proto. Returns the path."""
+    root, ext = os.path.splitext(output_proto)
+    path = f"{root}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}{ext or '.pb'}"
+    print(f"Writing proto to {path}")
+    model.export_to_file(path)
+    return path
+
+
+def load_model(path):
+    """Load a model written by export_model."""
+    if path.endswith("txt"):
+        with open(path) as f:
+            text = f.read()
+    else:
+        with open(path, "rb") as f:
+            text = text_format.MessageToString(cp_model_pb2.CpModelProto.FromString(f.read()))
+    model = cp_model.CpModel()
+    model.Proto().parse_text_format(text)
+    return model
+
+
+def solve_model_file(path):
+    """Re-solve a dumped model and print the shift assignments by employee index (csv row)."""
+    ctx = SolveContext()
+    model = load_model(path)
+    solver = cp_model.CpSolver()
+    profile = apply_solver_profile(solver, "main", ctx)
+    solver.parameters.max_time_in_seconds = ctx.max_solve_time
+    with EarlyStopPrinter(solver, ctx.early_stop_gap, ctx.early_stop_plateau) as solution_printer:
+        status = solver.solve(model, solution_printer)
+    print("Status = %s (profile %s)" % (solver.status_name(status), profile))
+    if status != cp_model.OPTIMAL and status != cp_model.FEASIBLE:
+        return False
+    print("Objective = %i" % solver.objective_value)
+
+    assigned = {}
+    for index, var in enumerate(model.Proto().variables):
+        # exact names: worked_pref_{e}_{d}_{dp} also starts with "work"
+        shift_cell = re.fullmatch(r"work(\d+)_(\d+)_(\d+)", var.name)
+        virtual_cell = re.fullmatch(r"virtual_work(\d+)_(\d+)", var.name)
+        if not (shift_cell or virtual_cell) or not solver.boolean_value(model.get_bool_var_from_proto_index(index)):
+            continue
+        if shift_cell:
+            e, s, d = (int(x) for x in shift_cell.groups())
+            assigned.setdefault(d, []).append(f"{shifts[s]}={e}")
+        else:
+            e, d = (int(x) for x in virtual_cell.groups())
+            assigned.setdefault(d, []).append(f"VIRTUAL={e}")
+    for d in sorted(assigned):
+        print(f"day {d+1}: {' '.join(assigned[d])}")
+    return True
+
+
+class CachedSolution:
+    """Stands in for the CpSolver of a cached solve: answers boolean_value() from the stored values."""
+    def __init__(self, values, objective=0.0, optimal=False):
+        self.values = values
+        # what SnapshotWriter reads from a solution callback; the bound is only known for an optimum
+        self.objective_value = objective
+        self.best_objective_bound = objective if optimal else None
+        self.wall_time = 0.0
+
+    def boolean_value(self, literal):
+        if isinstance(literal, bool):
+            return literal
+        index = literal.index
+        return bool(self.values[index]) if index >= 0 else not self.values[-index - 1]
+
+
+def schedule_cache_key(list_data, ctx=None):
+    """Content hash of the csv rows, every config.py value (as overridden by ctx) and this script's source."""
+    config_values = {name: globals()[name] for name in vars(config) if not name.startswith("_")}
+    config_values.update((ctx or SolveContext()).options())
+    with open(__file__, "rb") as f:
+        source = f.read()
+    digest = hashlib.sha256(repr((list_data, sorted(config_values.items()))).encode())
+    digest.update(source)
+    return digest.hexdigest()
+
+
+def store_cached_schedule(key, model, solver, status, work, virtual_work, employees_stats):
+    """Write the model, the best solution and the variable layout print_solution needs under cache_dir/key."""
+    layout = {
+        "status": solver.status_name(status),
+        "objective": solver.objective_value,
+        "values": list(solver.response_proto.solution),
+        "work": [[e, s, d, var.index] for (e, s, d), var in work.items() if var is not False],
+        "virtual_work": [[e, d, var.index] for (e, d), var in virtual_work.items() if var is not False],
+        "weights": [[[var.index, weight] for weight, variables in stat.vars_weights.items() for var in variables]
+                    for stat in employees_stats],
+    }
+    entry = os.path.join(cache_dir, key)
+    os.makedirs(cache_dir, exist_ok=True)
+    # written to a hidden temp dir first and renamed, so a reader never sees a half-written entry
+    tmp = tempfile.mkdtemp(prefix=".", dir=cache_dir)
+    model.export_to_file(os.path.join(tmp, "model.pb"))
+    with open(os.path.join(tmp, "solution.json"), "w") as f:
+        json.dump(layout, f)
+    shutil.rmtree(entry, ignore_errors=True)
+    os.replace(tmp, entry)
+    evict_schedule_cache()
+
+
+def evict_schedule_cache():
+    """Drop least recently used entries until the cache fits in cache_max_bytes."""
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.startswith("."):
+            continue
+        path = os.path.join(cache_dir, name)
+        size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+        entries.append((os.path.getmtime(path), size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= cache_max_bytes:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+
+
+def load_cached_schedule(key, employees_stats):
+    """On a cache hit return (solution, status, work, virtual_work) with employees_stats refilled, else None."""
+    entry = os.path.join(cache_dir, key)
+    if not os.path.isfile(os.path.join(entry, "solution.json")):
+        return None
+    os.utime(entry)  # LRU: a hit makes the entry the most recently used
+    with open(os.path.join(entry, "solution.json")) as f:
+        layout = json.load(f)
+    model = load_model(os.path.join(entry, "model.pb"))
+    var = model.get_bool_var_from_proto_index
+
+    work = {}
+    virtual_work = {}
+    for e in range(len(employees_stats)):
+        for s in range(len(shifts)):
+            for d in range(month_days):
+                work[e, s, d] = False
+        for d in range(month_days):
+            virtual_work[e, d] = False
+    for e, s, d, index in layout["work"]:
+        work[e, s, d] = var(index)
+    for e, d, index in layout["virtual_work"]:
+        virtual_work[e, d] = var(index)
+    for stat, weights in zip(employees_stats, layout["weights"]):
+        for index, weight in weights:
+            stat.add_var_weight(var(index), weight)
+    status = cp_model.OPTIMAL if layout["status"] == "OPTIMAL" else cp_model.FEASIBLE
+    return CachedSolution(layout["values"], layout["objective"], status == cp_model.OPTIMAL), status, work, virtual_work
+
+
+def limits_encoding_name():
+    """The --limits_encoding flag, else limits_encoding from config.py."""
+    if flags.FLAGS.is_parsed() and _LIMITS_ENCODING.value:
+        return _LIMITS_ENCODING.value
+    return limits_encoding
+
+
+def close_encoding_name():
+    """The --close_encoding flag, else close_encoding from config.py."""
+    if flags.FLAGS.is_parsed() and _CLOSE_ENCODING.value:
+        return _CLOSE_ENCODING.value
+    return close_encoding
+
+
+def symmetry_breaking_enabled():
+    """The --[no]symmetry_breaking flag, else symmetry_breaking from config.py."""
+    if flags.FLAGS.is_parsed() and _SYMMETRY_BREAKING.value is not None:
+        return _SYMMETRY_BREAKING.value
+    return symmetry_breaking
+
+
+def interchangeable_employees(employees, ctx):
+    """Groups (2 or more employee indexes) whose rows differ only in the name, so any schedule stays
+    valid and costs the same with their shifts swapped. Members of exclusive groups are left out."""
+    excluded = {e for grp in ctx.exclusive_groups for e in grp}
+    groups = {}
+    for e, emp in enumerate(employees):
+        if e in excluded:
+            continue
+        key = (emp.level, emp.min_shifts, emp.max_shifts, emp.extra_nights, emp.virtual_shifts, emp.gift_shifts,
+               emp.prefs.tobytes())
+        groups.setdefault(key, []).append(e)
+    return [grp for grp in groups.values() if len(grp) > 1]
+
+
+def add_lex_greater_equal(model, first, second, name):
+    """first >= second lexicographically, for two equally long lists of literals.
+
+    A chain of "equal so far" literals: where the prefixes agree, second may not be True unless first
+    is; the chain only has to be forced on, a solution can always leave it off once they differ."""
+    prefix_equal = None
+    for i, (a, b) in enumerate(zip(first, second)):
+        guard = [] if prefix_equal is None else [~prefix_equal]
+        model.add_bool_or(guard + [a, ~b])
+        if i == len(first) - 1:
+            break
+        equal = model.new_bool_var(f"{name}_{i}")
+        model.add_bool_or(guard + [~a, ~b, equal])
+        model.add_bool_or(guard + [a, b, equal])
+        prefix_equal = equal
+
+
+def add_symmetry_breaking(model, groups, work, virtual_work, num_shifts):
+    """Order the work sequences of each interchangeable group: all shift cells of the month, day by day,
+    then the virtual reserves."""
+    for grp in groups:
+        sequences = [live([work[e, s, d] for d in range(month_days) for s in range(num_shifts)]
+                          + [virtual_work[e, d] for d in range(month_days)]) for e in grp]
+        for i in range(len(grp) - 1):
+            add_lex_greater_equal(model, sequences[i], sequences[i + 1], f"lex_{grp[i]}_{grp[i + 1]}")
+
+
+def limits_cost(limits, k, c):
+    """(allowed, penalty) of a family count c when the total is k, read as the reified encoding reads it."""
+    (soft_low, hard_low, penalty_low), (soft_up, hard_up, penalty_up) = limits[k]
+    if (k > hard_up and c > hard_up) or (hard_low > 0 and c < hard_low):
+        return False, 0
+    penalty = 0
+    if hard_up > soft_up and k > soft_up and c > soft_up:
+        penalty += penalty_up
+    if soft_low > 0 and soft_low > hard_low and c < soft_low:
+        penalty += penalty_low
+    return True, penalty
+
+
+def add_limits_table(model, e, specific_input, total, count, totals, counts, cost_literals, cost_coefficients, employees_stats):
+    """One allowed-assignments constraint over (total, family count, penalty literals) for employee e.
+
+    Each distinct penalty of the table gets a literal that is set exactly on the (total, count) rows
+    costing that much, so the objective and the report see the same weights as the reified encoding."""
+    limits = specific_input["limits"][specific_input["index"](e)]
+    rows = {}
+    for k in totals:
+        for c in counts:
+            allowed, penalty = limits_cost(limits, k, c)
+            if allowed:
+                rows[k, c] = penalty
+    penalties = sorted(set(rows.values()) - {0})
+    paid = []
+    for penalty in penalties:
+        name = f'cnst_{specific_input["prefix"]}_{e}_penalty_{penalty}'
+        employees_stats[e].count_vars[name] = model.new_bool_var(name)
+        paid.append(employees_stats[e].count_vars[name])
+        cost_literals.append(employees_stats[e].count_vars[name])
+        cost_coefficients.append(penalty)
+        employees_stats[e].add_var_weight(employees_stats[e].count_vars[name], penalty)
+    model.add_allowed_assignments([total, count] + paid,
+                                  [[k, c] + [int(penalty == p) for p in penalties] for (k, c), penalty in rows.items()])
+
+
+def add_constraints(ctx, model, work, specific_input, num_employees, num_shifts, cost_coefficients, cost_literals, employees, employees_stats):
+    # the table encoding has no violation literals, so relaxed / assumption models stay reified
+    table = ctx.limits_encoding == "table" and not hard_rules_relaxed(ctx)
     for e in range(num_employees):
-        # in RELAX_HARD mode the MIN floor becomes soft, so start the count domain at 0
-        start_shifts = 0 if ("total_lambda" in specific_input or RELAX_HARD) else get_employee_min_shifts(employees,e)
+        # in relax / assume mode the MIN floor becomes soft, so start the count domain at 0
+        start_shifts = 0 if ("total_lambda" in specific_input or hard_rules_relaxed(ctx)) else get_employee_min_shifts(employees,e)
+        # in assume mode the MAX ceiling is guarded too, so the total may reach the month length
+        end_shifts = month_days if (ctx.assume_hard and "total_lambda" not in specific_input) else get_employee_max_shifts(employees,e)
         total_var_name = f'cnst_total_count_{e}' if "total_lambda" not in specific_input else f'cnst_total_count_{specific_input["prefix"]}_{e}'
 
         if total_var_name not in employees_stats[e].count_vars:
             employees_stats[e].count_vars[total_var_name] = model.new_int_var(start_shifts,
-                                                                              get_employee_max_shifts(employees,e),
+                                                                              end_shifts,
                                                                               total_var_name)
-            employee_works = [work[e, s, d] for s in range(num_shifts) for d in range(month_days) if (("total_lambda" not in specific_input) or specific_input["total_lambda"](e, s, d))]
+            employee_works = live([work[e, s, d] for s in range(num_shifts) for d in range(month_days) if (("total_lambda" not in specific_input) or specific_input["total_lambda"](e, s, d))])
             #if "total_lambda" in specific_input:
             #    print (f'{total_var_name} = sum of {len(employee_works)} variables')
             model.add(employees_stats[e].count_vars[total_var_name] == sum(employee_works))
 
-            if RELAX_HARD and "total_lambda" not in specific_input:
+            if hard_rules_relaxed(ctx) and "total_lambda" not in specific_input:
                 real_min = get_employee_min_shifts(employees, e)
                 if real_min > 0:
-                    below = register_violation(model, cost_literals, cost_coefficients,
-                        f"{get_employee_name(employees,e)}: total shifts below MIN {real_min}", 2 * RELAX_PENALTY)
+                    below = register_violation(ctx, model, cost_literals, cost_coefficients,
+                        f"{get_employee_name(employees,e)}: total shifts below MIN {real_min}", 2 * RELAX_PENALTY,
+                        guard=f"{get_employee_name(employees,e)}: MIN {real_min}")
                     model.add(employees_stats[e].count_vars[total_var_name] >= real_min).OnlyEnforceIf(~below)
                     model.add(employees_stats[e].count_vars[total_var_name] < real_min).OnlyEnforceIf(below)
 
-            for shift_count in range(start_shifts, get_employee_max_shifts(employees,e) + 1):
-                count_var_name = f'{total_var_name}_{shift_count}'
-                employees_stats[e].count_vars[count_var_name] = model.new_bool_var(count_var_name)
-                model.add(employees_stats[e].count_vars[total_var_name] == shift_count).only_enforce_if(
-                    employees_stats[e].count_vars[count_var_name])
-                model.add(employees_stats[e].count_vars[total_var_name] != shift_count).only_enforce_if(
-                    ~employees_stats[e].count_vars[count_var_name])
+            if ctx.assume_hard and "total_lambda" not in specific_input:
+                real_max = get_employee_max_shifts(employees, e)
+                above = register_violation(ctx, model, cost_literals, cost_coefficients, "", guard=f"{get_employee_name(employees,e)}: MAX {real_max}")
+                model.add(employees_stats[e].count_vars[total_var_name] <= real_max).OnlyEnforceIf(~above)
+
+            # the table encoding reads the total directly, only the reified one needs its one-hot
+            if not table:
+                for shift_count in range(start_shifts, get_employee_max_shifts(employees,e) + 1):
+                    count_var_name = f'{total_var_name}_{shift_count}'
+                    employees_stats[e].count_vars[count_var_name] = model.new_bool_var(count_var_name)
+                    model.add(employees_stats[e].count_vars[total_var_name] == shift_count).only_enforce_if(
+                        employees_stats[e].count_vars[count_var_name])
+                    model.add(employees_stats[e].count_vars[total_var_name] != shift_count).only_enforce_if(
+                        ~employees_stats[e].count_vars[count_var_name])
 
         if specific_input["applicable"](e):
             specific_var_name = f'cnst_{specific_input["prefix"]}_count_{e}'
             if "lambda" in specific_input:
                 employees_stats[e].count_vars[specific_var_name] = model.new_int_var(0, get_employee_max_shifts(employees,e),
                                                                                      specific_var_name)
-                specific_employee_works = [work[e, s, d] for s in range(num_shifts) for d in range(month_days) if
-                                           specific_input["lambda"](e, s, d)]
+                specific_employee_works = live([work[e, s, d] for s in range(num_shifts) for d in range(month_days) if
+                                                specific_input["lambda"](e, s, d)])
                 model.add(employees_stats[e].count_vars[specific_var_name] == sum(specific_employee_works))
             elif "set_lambda" in specific_input:
                 employees_stats[e].count_vars[specific_var_name] = model.new_int_var(0, specific_input["max_value"],
@@ -928,6 +1936,14 @@ def add_constraints(model, work, specific_input, num_employees, num_shifts, cost
                 print('wrong lamda')
                 exit(1)
 
+            if table:
+                count_max = get_employee_max_shifts(employees,e) if "lambda" in specific_input else specific_input["max_value"]
+                add_limits_table(model, e, specific_input, employees_stats[e].count_vars[total_var_name],
+                                 employees_stats[e].count_vars[specific_var_name],
+                                 range(start_shifts, get_employee_max_shifts(employees,e) + 1), range(count_max + 1),
+                                 cost_literals, cost_coefficients, employees_stats)
+                continue
+
             for shift_count in range(start_shifts, get_employee_max_shifts(employees,e) + 1):
                 soft_lim, hard_lim, penalty = specific_input["limits"][specific_input["index"](e)][shift_count][1]
 
@@ -949,11 +1965,12 @@ def add_constraints(model, work, specific_input, num_employees, num_shifts, cost
                         ~employees_stats[e].count_vars[hard_var_name])
 
                 if shift_count > hard_lim:
-                    if RELAX_HARD:
+                    if hard_rules_relaxed(ctx):
                         viol_key = f'viol_{specific_input["prefix"]}_upper_{e}'
                         if viol_key not in employees_stats[e].count_vars:
-                            employees_stats[e].count_vars[viol_key] = register_violation(model, cost_literals, cost_coefficients,
-                                f"{get_employee_name(employees,e)}: {specific_input['prefix']} shifts over hard MAX")
+                            employees_stats[e].count_vars[viol_key] = register_violation(ctx, model, cost_literals, cost_coefficients,
+                                f"{get_employee_name(employees,e)}: {specific_input['prefix']} shifts over hard MAX",
+                                guard=f"{specific_input['prefix']}_limits")
                         model.add_bool_or(~employees_stats[e].count_vars[f'{total_var_name}_{shift_count}'],
                                       ~employees_stats[e].count_vars[hard_var_name],
                                       employees_stats[e].count_vars[viol_key])
@@ -992,11 +2009,12 @@ def add_constraints(model, work, specific_input, num_employees, num_shifts, cost
                         ~employees_stats[e].count_vars[hard_var_name])
 
                 if hard_lim > 0:
-                    if RELAX_HARD:
+                    if hard_rules_relaxed(ctx):
                         viol_key = f'viol_{specific_input["prefix"]}_lower_{e}'
                         if viol_key not in employees_stats[e].count_vars:
-                            employees_stats[e].count_vars[viol_key] = register_violation(model, cost_literals, cost_coefficients,
-                                f"{get_employee_name(employees,e)}: {specific_input['prefix']} shifts under hard MIN")
+                            employees_stats[e].count_vars[viol_key] = register_violation(ctx, model, cost_literals, cost_coefficients,
+                                f"{get_employee_name(employees,e)}: {specific_input['prefix']} shifts under hard MIN",
+                                guard=f"{specific_input['prefix']}_limits")
                         model.add_bool_or(~employees_stats[e].count_vars[f'{total_var_name}_{shift_count}'],
                                       ~employees_stats[e].count_vars[hard_var_name],
                                       employees_stats[e].count_vars[viol_key])
@@ -1015,9 +2033,9 @@ def add_constraints(model, work, specific_input, num_employees, num_shifts, cost
                     employees_stats[e].add_var_weight(employees_stats[e].count_vars[soft_lim_var],penalty)
 
 
-def print_broken_rules(solver):
-    """After a RELAX_HARD solve, list which softened hard rules the solution had to break."""
-    broken = [desc for (v, desc) in relaxations if solver.boolean_value(v)]
+def print_broken_rules(ctx, solver):
+    """After a "relax" mode solve, list which softened hard rules the solution had to break."""
+    broken = [desc for (v, desc) in ctx.relaxations if solver.boolean_value(v)]
     print("\n" + "=" * 72)
     print("BEST-EFFORT SOLUTION — BROKEN HARD RULES")
     print("=" * 72)
@@ -1033,36 +2051,11 @@ def print_broken_rules(solver):
     print("=" * 72 + "\n")
 
 
-def solve_best_effort(list_data):
+def solve_best_effort(list_data, ctx=None, solver_workers=0, report_path=""):
     """Relax every hard rule to soft-with-penalty and solve, to get a schedule + broken-rule report."""
-    global RELAX_HARD
     print("\n" + "=" * 72)
     print("BEST-EFFORT (RELAXED) SOLVE — producing a schedule despite infeasibility")
     print("=" * 72)
-    RELAX_HARD = True
-    try:
-        cost_literals = []
-        cost_coefficients = []
-        work = {}
-        virtual_work = {}
-        black_listed = {}
-        employees = []
-        employees_stats = []
-        format_input(list_data, employees, employees_stats)
-        solve_shift_scheduling("", cost_literals, cost_coefficients, work,
-                               virtual_work, black_listed, employees, employees_stats, [])
-    finally:
-        RELAX_HARD = False
-
-
-def _loose_limits_table(n_indices=6, max_count=31):
-    """A *_limits replacement that imposes no bound (lower 0, upper huge, no penalty)."""
-    entry = {c: ((0, 0, 0), (99, 99, 0)) for c in range(max_count + 1)}
-    return [dict(entry) for _ in range(n_indices)]
-
-
-def _solve_full(list_data, diagnostic=True, zero_mins=False):
-    """Build a fresh model from list_data and solve the whole month. Returns True if feasible."""
     cost_literals = []
     cost_coefficients = []
     work = {}
@@ -1071,44 +2064,76 @@ def _solve_full(list_data, diagnostic=True, zero_mins=False):
     employees = []
     employees_stats = []
     format_input(list_data, employees, employees_stats)
-    if zero_mins:
-        for emp in employees:
-            emp[2][0] = 0
-    return solve_shift_scheduling("", cost_literals, cost_coefficients, work,
-                                  virtual_work, black_listed, employees,
-                                  employees_stats, [], diagnostic=diagnostic)
+    return solve_shift_scheduling("", cost_literals, cost_coefficients, work, virtual_work, black_listed,
+                                  employees, employees_stats, [], solver_workers=solver_workers,
+                                  report_path=report_path, ctx=(ctx or SolveContext()).with_mode("relax"))
+
 
+def _race_relaxed(list_data, ctx, solver_workers, log_path, report_path):
+    """RelaxedRace process entry point: the best-effort solve with all its output going to log_path."""
+    with open(log_path, "w") as log:
+        # fd level, so the solver's own logging lands in the file too
+        os.dup2(log.fileno(), 1)
+        try:
+            solve_best_effort(list_data, ctx, solver_workers, report_path)
+        finally:
+            print(flush=True)
+
+
+class RelaxedRace:
+    """The best-effort relaxed solve running in a forked process alongside the strict one (--race).
+
+    Its output and html report are held back in a temp dir: finish() waits for it and shows both
+    (for when the strict solve failed), cancel() stops it and drops them. The process is a daemon,
+    so it does not outlive the run either way."""
+    def __init__(self, list_data, ctx, solver_workers=0):
+        import multiprocessing  # only the race needs a process of its own
+        self.directory = tempfile.mkdtemp(prefix="race-")
+        self.log_path = os.path.join(self.directory, "relaxed.log")
+        self.report_path = os.path.join(self.directory, "relaxed.html")
+        self.process = multiprocessing.get_context("fork").Process(
+            target=_race_relaxed, args=(list_data, ctx, solver_workers, self.log_path, self.report_path), daemon=True)
+        self.process.start()
+        print(f"racing a relaxed (best-effort) solve in process {self.process.pid}")
+
+    def finish(self):
+        """Wait for the relaxed solve, print its output and open its report. Returns True if it produced one."""
+        waited = time.perf_counter()
+        self.process.join()
+        print(f"\nrelaxed solve from the race (waited {time.perf_counter() - waited:.1f}s for it after the strict solve):")
+        with open(self.log_path) as f:
+            print(f.read(), end="")
+        if not os.path.isfile(self.report_path):
+            return False
+        open_report(self.report_path)
+        return True
+
+    def cancel(self):
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process.join()
+        shutil.rmtree(self.directory, ignore_errors=True)
 
-def report_capacity(list_data):
+
+def report_capacity(list_data, ctx=None):
     """Aggregate necessary-condition check: required shifts per category vs available capacity."""
     employees = []
     stats = []
     format_input(list_data, employees, stats)
     n = len(employees)
 
-    total = nights = internal = holiday = virtual = 0
-    for d in range(month_days):
-        if is_holiday(d):
-            day_shifts = set(holiday_shifts)
-        else:
-            day_shifts = set(week_day_shifts)
-        day_shifts = day_shifts.intersection(set(shift_groups[(d + month_starts_with_internal) % len(shift_groups)]))
-        for s in range(len(shifts)):
-            if shifts[s] in day_shifts:
-                total += 1
-                if is_night_shift(s):
-                    nights += 1
-                if is_internal(s):
-                    internal += 1
-                if is_holiday(d):
-                    holiday += 1
-        if (d + month_starts_with_internal) % len(shift_groups) == 1:
-            virtual += 1
+    cal = ShiftCalendar()
+    total = int(cal.required.sum())
+    nights = int(cal.required[:, cal.is_night].sum())
+    internal = int(cal.required[:, cal.is_internal].sum())
+    holiday = int(cal.required[cal.is_holiday].sum())
+    virtual = int(cal.has_virtual_reserve.sum())
 
     sum_max = sum(get_employee_max_shifts(employees, e) for e in range(n))
     sum_min = sum(get_employee_min_shifts(employees, e) for e in range(n))
 
     # night capacity: sum over night-capable doctors of the largest night hard-cap in their MIN..MAX range
+    night_limits = (ctx or SolveContext()).night_limits  # the tables this solve uses
     night_cap = 0
     for e in range(n):
         if not (can_do_nights(employees, e) and get_employee_max_shifts(employees, e) > 0):
@@ -1140,54 +2165,433 @@ def report_capacity(list_data):
     print(f"  {'holiday shifts':24s} required={holiday:4d}   (covered from sum(MAX)={sum_max})")
 
 
-def diagnose_infeasibility(list_data):
-    """Run when the full month is infeasible: capacity report + one-family-at-a-time relaxation."""
+def _solve_with_assumptions(model, guards, groups, ctx):
+    """Solve `model` assuming every rule group in `groups` holds. Returns (status, conflicting groups)."""
+    by_index = {guards[g].index: g for g in groups}
+    model.clear_assumptions()
+    model.add_assumptions([~guards[g] for g in groups])
+    solver = cp_model.CpSolver()
+    apply_solver_profile(solver, "diagnostic", ctx)
+    solver.parameters.max_time_in_seconds = ctx.diagnostic_solve_time
+    status = solver.solve(model)
+    core = []
+    if status == cp_model.INFEASIBLE:
+        for lit in solver.sufficient_assumptions_for_infeasibility():
+            core.append(by_index[lit if lit >= 0 else -lit - 1])
+    return status, core
+
+
+def quickxplain(infeasible, items, background=()):
+    """QuickXplain: a minimal list of items that, on top of background, infeasible() still rejects.
+
+    infeasible must be monotone (more items only add constraints), background alone feasible and
+    background + items infeasible. The items are split in halves and each half kept only if the rest
+    cannot explain the conflict alone: O(k log(n/k)) calls for k of the n items."""
+    def explain(background, background_changed, items):
+        if background_changed and infeasible(background):
+            return []
+        if len(items) == 1:
+            return items
+        first, second = items[:len(items) // 2], items[len(items) // 2:]
+        conflict_second = explain(background + first, True, second)
+        conflict_first = explain(background + conflict_second, bool(conflict_second), first)
+        return conflict_first + conflict_second
+    return explain(list(background), False, list(items))
+
+
+def rule_family(group):
+    """The family of an assumption rule group: per-day coverage and per-employee MIN / MAX are pooled."""
+    if group.startswith("coverage of day "):
+        return "coverage"
+    for bound in ("MIN", "MAX"):
+        if re.search(rf": {bound} \d+$", group):
+            return f"{bound} totals"
+    return group
+
+
+class _OutOfSolves(Exception):
+    """The refinement of find_conflicting_rules spent its diagnostic_refine_solves."""
+
+
+def find_conflicting_rules(list_data, ctx=None):
+    """Build the month model once with every hard-rule group behind an assumption literal.
+
+    The conflict is narrowed with QuickXplain over assumption solves of that one model, first over
+    rule families (see rule_family), then inside each conflicting family, smallest first, until
+    diagnostic_refine_solves solves are spent; a family left unrefined keeps the groups of the
+    solver's core. A solve that hits its time limit counts as feasible, which can only keep more.
+    Returns (status, groups, minimal): on INFEASIBLE, groups is a set of rule groups that cannot hold
+    together. minimal is False when a solve hit the time limit or a family was left unrefined."""
+    ctx = (ctx or SolveContext()).with_mode("assume")
+    cost_literals = []
+    cost_coefficients = []
+    work = {}
+    virtual_work = {}
+    black_listed = {}
+    employees = []
+    employees_stats = []
+    format_input(list_data, employees, employees_stats)
+    model = build_model(cost_literals, cost_coefficients, work, virtual_work, black_listed,
+                        employees, employees_stats, [], diagnostic=True, ctx=ctx)
+    if model is None:
+        return cp_model.MODEL_INVALID, [], False
+    # only feasibility matters here
+    model.clear_objective()
+    guards = ctx.assumption_guards
+
+    status, core = _solve_with_assumptions(model, guards, list(guards), ctx)
+    if status != cp_model.INFEASIBLE or not core:
+        # an empty core means the model is infeasible without any guarded group (capability / structure)
+        return status, core, True
+
+    statuses = {frozenset(core): cp_model.INFEASIBLE}
+    cores = {frozenset(core): core}
+    solves_left = None  # unlimited while the families are narrowed
+
+    def infeasible(groups):
+        nonlocal solves_left
+        key = frozenset(groups)
+        if key not in statuses:
+            if solves_left == 0:
+                raise _OutOfSolves
+            if solves_left is not None:
+                solves_left -= 1
+            statuses[key], cores[key] = _solve_with_assumptions(model, guards, [g for g in core if g in key], ctx)
+        return statuses[key] == cp_model.INFEASIBLE
+
+    members = {}
+    for group in core:
+        members.setdefault(rule_family(group), []).append(group)
+    families = quickxplain(lambda fams: infeasible([g for f in fams for g in members[f]]), list(members))
+    family_groups = [g for f in families for g in members[f]]
+    if not infeasible(family_groups):
+        return cp_model.INFEASIBLE, core, False
+    # the solver's core of the family-level conflict narrows each family for free
+    family_core = cores[frozenset(family_groups)]
+    conflict = {f: [g for g in members[f] if g in family_core] or members[f] for f in families}
+
+    refined = True
+    solves_left = ctx.diagnostic_refine_solves
+    for family in sorted(conflict, key=lambda f: len(conflict[f])):
+        background = [g for f in conflict if f != family for g in conflict[f]]
+        try:
+            conflict[family] = quickxplain(infeasible, conflict[family], background)
+        except _OutOfSolves:
+            refined = False
+            break
+    solves_left = None
+    groups = [g for g in core if any(g in conflict[f] for f in conflict)]
+    if not infeasible(groups):
+        return cp_model.INFEASIBLE, family_groups, False
+    return cp_model.INFEASIBLE, groups, refined and cp_model.UNKNOWN not in statuses.values()
+
+
+def _max_flow(capacity, source, sink):
+    """Edmonds-Karp on a dict-of-dicts capacity graph (mutated into the residual graph). Returns the flow value."""
+    flow = 0
+    while True:
+        parent = {source: None}
+        queue = [source]
+        for node in queue:
+            if sink in parent:
+                break
+            for nxt, cap in capacity[node].items():
+                if cap > 0 and nxt not in parent:
+                    parent[nxt] = node
+                    queue.append(nxt)
+        if sink not in parent:
+            return flow
+        node = sink
+        while parent[node] is not None:
+            prev = parent[node]
+            capacity[prev][node] -= 1
+            capacity[node][prev] = capacity[node].get(prev, 0) + 1
+            node = prev
+        flow += 1
+
+
+def can_take_virtual_reserve(employees, e, ctx):
+    """Whether the virtual limits let employee e take at least one reserve at any night total they can reach."""
+    limits = ctx.virtual_limits[1 if get_employee_virtual_shifts(employees, e) > 0 else 0]
+    night_totals = range(get_employee_max_shifts(employees, e) + 1) if can_do_nights(employees, e) else [0]
+    return any(limits_cost(limits, k, c)[0] for k in night_totals if k in limits for c in (1, 2))
+
+
+def check_daily_coverage(employees, ctx=None):
+    """Necessary per-day condition: every required slot of a day needs its own eligible employee.
+
+    An employee is eligible for a slot if the shift is in their level, the slot's day part is not
+    marked "N" (and, with a "P" that day, is the P day part) and MAX > 0. They are eligible for the
+    virtual reserve if the day has no "N" or "P" and the virtual limits allow a reserve at some night
+    total they can reach (the table is keyed by nights, so a doctor without nights may take reserves
+    too). Exclusive group members share one unit of capacity per day part: the group is split into
+    an in and an out node joined by a capacity-1 edge. Runs a unit max-flow per day
+    (source -> slot -> [group in -> group out, day part] -> employee -> sink), no CP-SAT involved.
+    Returns {day: [problem description, ...]} for the days that cannot be staffed."""
+    num_employees = len(employees)
+    cal = ShiftCalendar()
+    ctx = ctx or SolveContext()
+    takes_reserve = [can_take_virtual_reserve(employees, e, ctx) for e in range(num_employees)]
+    group_of = {}
+    for g, grp in enumerate(ctx.exclusive_groups):
+        for e in grp:
+            # an employee in several groups keeps only the first one: a relaxation, so the check stays sound
+            group_of.setdefault(e, g)
+
+    problems = {}
+    for d in range(month_days):
+        slots = [("shift", s) for s in numpy.flatnonzero(cal.required[d]).tolist()]
+        if cal.has_virtual_reserve[d]:
+            slots.append(("virtual", None))
+
+        capacity = {"source": {}, "sink": {}}
+        missing = []
+        for slot in slots:
+            capacity["source"][slot] = 1
+            capacity[slot] = {}
+            for e in range(num_employees):
+                prefs = employees[e].prefs[d]
+                kind, s = slot
+                if kind == "virtual":
+                    eligible = takes_reserve[e] and not ((prefs == PREF_N) | (prefs == PREF_P)).any()
+                    via = ("employee", e)
+                else:
+                    dp_idx = cal.day_part[s]
+                    eligible = (get_employee_max_shifts(employees, e) > 0
+                                and can_do_shift(employees, e, s)
+                                and prefs[dp_idx] != PREF_N
+                                and (not (prefs == PREF_P).any() or prefs[dp_idx] == PREF_P))
+                    via = ("group_in", group_of[e], dp_idx) if e in group_of else ("employee", e)
+                if not eligible:
+                    continue
+                capacity.setdefault(("employee", e), {})["sink"] = 1
+                if via[0] == "group_in":
+                    group_out = ("group_out",) + via[1:]
+                    capacity.setdefault(via, {})[group_out] = 1
+                    capacity.setdefault(group_out, {})[("employee", e)] = 1
+                capacity[slot][via] = 1
+            if not capacity[slot]:
+                missing.append(shifts[slot[1]] if slot[0] == "shift" else "virtual reserve")
+
+        staffed = _max_flow(capacity, "source", "sink")
+        if missing or staffed < len(slots):
+            day_problems = []
+            if missing:
+                day_problems.append(f"no eligible employee for {', '.join(missing)}")
+            if staffed < len(slots):
+                day_problems.append(f"only {staffed} of {len(slots)} slots can be staffed at once")
+            problems[d] = day_problems
+    return problems
+
+
+def report_daily_coverage(employees, ctx=None):
+    """Print the per-day coverage pre-check. Returns the 1-based days that cannot be staffed."""
+    start = time.perf_counter()
+    problems = check_daily_coverage(employees, ctx)
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"\n--- per-day coverage pre-check ({month_days} days in {elapsed:.1f} ms) ---")
+    if not problems:
+        print("  every day can be staffed on its own")
+    for d, day_problems in problems.items():
+        print(f"  day {d+1}: {'; '.join(day_problems)}")
+    return [d + 1 for d in problems]
+
+
+def diagnose_infeasibility(list_data, ctx=None):
+    """Run when the full month is infeasible: capacity report + minimal conflicting set of rule groups.
+
+    Returns the conflicting groups, or None if the diagnosis was inconclusive."""
     print("\n" + "=" * 72)
     print("INFEASIBILITY DIAGNOSIS")
     print("=" * 72)
 
-    report_capacity(list_data)
+    ctx = ctx or SolveContext()
+    report_capacity(list_data, ctx)
+
+    print("\n--- conflicting rule groups (single model, CP-SAT assumptions) ---")
+    print("    every constraint family, each day's coverage and each employee's MIN/MAX is a group;")
+    print("    the groups listed below cannot all hold together")
+    print(f"    (each solve capped at {ctx.diagnostic_solve_time}s)\n")
+
+    status, core, minimal = find_conflicting_rules(list_data, ctx)
+    if status == cp_model.INFEASIBLE and not core:
+        print("  no guarded rule group is involved: the conflict is in capability or basic rules")
+    elif status == cp_model.INFEASIBLE:
+        print(f"  rule families: {', '.join(dict.fromkeys(rule_family(group) for group in core))}\n")
+        for group in core:
+            print(f"  - {group}")
+        if minimal:
+            print("\n  dropping any one of them fixes it")
+        else:
+            print("\n  may not be minimal: a solve hit the time limit, or narrowing the families down took more")
+            print(f"  than {ctx.diagnostic_refine_solves} solves and the solver's own core was kept")
+    elif status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+        print("  the month is feasible with every rule group: the failed solve hit its time limit")
+    else:
+        print("  inconclusive: the solve hit the time limit")
+        return None
+    print("=" * 72 + "\n")
+    return core
 
-    print("\n--- constraint-family isolation (relax ONE family, re-solve full month) ---")
-    print("    a family whose relaxation flips the month to FEASIBLE is a prime suspect")
-    print(f"    (each re-solve capped at {diagnostic_solve_time}s; 'inconclusive' = hit time limit)\n")
 
-    def report(label, res):
-        verdict = "FEASIBLE when relaxed  <-- suspect" if res else "still infeasible"
-        print(f"  relax {label:22s} -> {verdict}")
+def _check_days_worker(list_data, check_days, solver_workers, ctx):
+    """Process-pool entry point: build a fresh model restricted to check_days and solve it."""
+    cost_literals = []
+    cost_coefficients = []
+    work = {}
+    virtual_work = {}
+    black_listed = {}
+    employees = []
+    employees_stats = []
+    format_input(list_data, employees, employees_stats)
+    return solve_shift_scheduling("", cost_literals, cost_coefficients, work, virtual_work, black_listed,
+                                  employees, employees_stats, check_days, solver_workers=solver_workers, ctx=ctx)
 
-    loose = _loose_limits_table()
-    for fam in ["night_limits", "holiday_limits", "internal_limits", "virtual_limits"]:
-        saved = globals()[fam]
-        globals()[fam] = loose
-        try:
-            report(fam, _solve_full(list_data))
-        finally:
-            globals()[fam] = saved
 
-    saved = globals()["exclusive_groups"]
-    globals()["exclusive_groups"] = []
-    try:
-        report("exclusive_groups", _solve_full(list_data))
-    finally:
-        globals()["exclusive_groups"] = saved
+def _check_days_status(list_data, days, ctx):
+    """Status of the month with only `days` covered: a check solve, stopped at the first solution.
 
-    report("MIN totals (set to 0)", _solve_full(list_data, zero_mins=True))
+    Solved with the main profile: the light check profile is tuned for finding a first solution and
+    rarely proves a large day set infeasible. The time limit grows with the days covered, from
+    max_solve_time_check up to max_solve_time for the month."""
+    cost_literals = []
+    cost_coefficients = []
+    work = {}
+    virtual_work = {}
+    black_listed = {}
+    employees = []
+    employees_stats = []
+    format_input(list_data, employees, employees_stats)
+    model = build_model(cost_literals, cost_coefficients, work, virtual_work, black_listed,
+                        employees, employees_stats, sorted(days), diagnostic=True, ctx=ctx)
+    if model is None:
+        return cp_model.MODEL_INVALID
+    # only feasibility matters here
+    model.clear_objective()
+    solver = cp_model.CpSolver()
+    apply_solver_profile(solver, "main", ctx)
+    solver.parameters.max_time_in_seconds = max(ctx.max_solve_time_check, ctx.max_solve_time * len(days) / month_days)
+    with EarlyStopPrinter(solver, ctx.early_stop_gap, ctx.early_stop_plateau, first_solution=True,
+                          verbose=False) as solution_printer:
+        return solver.solve(model, solution_printer)
+
+
+def find_minimal_infeasible_days(list_data, ctx=None, month_status=None):
+    """QuickXplain over the days of the month: a minimal set of days whose coverage cannot be met together.
+
+    Covering more days only adds constraints, so the days can be split in halves and each half kept
+    only if the rest cannot explain the conflict alone. That takes O(k log(n/k)) check solves for a
+    set of k of the n days, and every result is cached by its day set. A check that hits its time
+    limit counts as feasible, which can only make the set larger; the set found is checked at the end.
+    month_status is the status of a full solve of the month already run (e.g. the strict solve), so
+    the search does not start by proving it again.
+    Returns (status, days, solves): INFEASIBLE with the 0-based days, UNKNOWN with an unproven set,
+    or the status of the whole month check (OPTIMAL / FEASIBLE: every day can be covered) and []."""
+    ctx = ctx or SolveContext()
+    month = list(range(month_days))
+    statuses = {}
+    if month_status is not None:
+        statuses[frozenset(month)] = month_status
+    seeded = len(statuses)
+
+    def infeasible(days):
+        key = frozenset(days)
+        if not key:  # an empty check_days would mean the whole month
+            return False
+        if key not in statuses:
+            statuses[key] = _check_days_status(list_data, key, ctx)
+        return statuses[key] == cp_model.INFEASIBLE
+
+    if not infeasible(month):
+        return statuses[frozenset(month)], [], len(statuses) - seeded
+    days = sorted(quickxplain(infeasible, month))
+    return (cp_model.INFEASIBLE if infeasible(days) else cp_model.UNKNOWN), days, len(statuses) - seeded
+
+
+def report_infeasible_days(list_data, ctx=None, month_status=None):
+    """Print the minimal infeasible day set of find_minimal_infeasible_days with what it points at."""
+    ctx = ctx or SolveContext()
+    start = time.perf_counter()
+    status, days, solves = find_minimal_infeasible_days(list_data, ctx, month_status)
+    elapsed = time.perf_counter() - start
+    print("\n" + "=" * 72)
+    print("INFEASIBILITY VERDICT")
+    print("=" * 72)
+    print(f"minimal infeasible day set search: {solves} check solve(s) ({ctx.profile_name('main')}) of at most "
+          f"{max(ctx.max_solve_time_check, ctx.max_solve_time)}s by the days covered, {elapsed:.1f}s in total")
+    numbers = [d + 1 for d in days]
+    if status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+        print("every day can be covered together: the failed solve hit its time limit")
+    elif status != cp_model.INFEASIBLE and not days:
+        print("inconclusive: the check of the whole month hit its time limit")
+    else:
+        if status != cp_model.INFEASIBLE:
+            print("inconclusive: the day set below could not be proven infeasible within the time limit")
+        print(f"these day(s) cannot all be covered together, and dropping any one of them fixes it: {numbers}")
+        if len(days) == 1:
+            print("  -> a single day cannot be staffed. Check availability (N marks), premium")
+            print("     M1/A1/N1 slots that need level AA/A, and per-day 'P' conflicts on that day.")
+        elif days[-1] - days[0] == len(days) - 1:
+            print("  -> a run of consecutive days. Check close-shift / close-night spacing and")
+            print("     clustered availability around those days.")
+        else:
+            print("  -> days apart from each other. The blocker is a month-total limit shared by those")
+            print("     days (night / holiday / internal limits, MAX, salary cap) or a cross-family")
+            print("     interaction; see the capacity report above.")
+    print("=" * 72)
 
-    saved = {fam: globals()[fam] for fam in ["night_limits", "holiday_limits", "internal_limits", "virtual_limits"]}
-    for fam in saved:
-        globals()[fam] = loose
-    try:
-        report("ALL *_limits", _solve_full(list_data))
-    finally:
-        for fam, val in saved.items():
-            globals()[fam] = val
-    print("=" * 72 + "\n")
+
+def sweep_check_days(list_data, max_workers=0, ctx=None):
+    """Check every single day and every 5-day window on a process pool.
+
+    Results are reported as they finish. Returns (failed_days, failed_windows) as sorted 1-based day numbers."""
+    ctx = ctx or SolveContext()
+    jobs = [("day", d, [d]) for d in range(month_days)]
+    jobs += [("window", d, list(range(d, d + 5))) for d in range(month_days - 4)]
+
+    cpus = os.cpu_count() or 1
+    workers = min(max_workers if max_workers > 0 else cpus, len(jobs))
+    # split the cores between the pool processes so CP-SAT does not oversubscribe the machine
+    solver_workers = max(1, cpus // workers)
+    print(f"feasibility sweep: {len(jobs)} checks on {workers} process(es), {solver_workers} solver worker(s) each, "
+          f"profile {ctx.profile_name('check')}")
+
+    import concurrent.futures  # only the sweep needs a pool
+    failed_days = []
+    failed_windows = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_check_days_worker, list_data, check_days, solver_workers, ctx): (kind, d)
+                   for kind, d, check_days in jobs}
+        for future in concurrent.futures.as_completed(futures):
+            kind, d = futures[future]
+            result = future.result()
+            if kind == "day":
+                print(f"day {d+1} = {result}")
+                if not result:
+                    failed_days.append(d + 1)
+            else:
+                print(f"day {d+1} + 4 days = {result}")
+                if not result:
+                    failed_windows.append(d + 1)
+    return sorted(failed_days), sorted(failed_windows)
 
 
 def main(_):
-    data = pandas.read_csv(filename).fillna("I")
-    list_data = data.values.tolist()
+    for kind in ("main", "diagnostic", "check"):
+        if solver_profile_name(kind) not in solver_profiles:
+            print(f"unknown {kind} solver profile '{solver_profile_name(kind)}', "
+                  f"expected one of {sorted(solver_profiles)}")
+            return
+
+    if _SOLVE_PROTO.value:
+        solve_model_file(_SOLVE_PROTO.value)
+        return
+
+    try:
+        list_data = read_input(filename)
+    except ValueError as e:
+        print(e)
+        return
 
     cost_literals = []
     cost_coefficients = []
@@ -1202,70 +2606,99 @@ def main(_):
     for e in employees:
         print(e)
 
-    if not solve_shift_scheduling(_OUTPUT_PROTO.value, cost_literals, cost_coefficients, work, virtual_work, black_listed, employees, employees_stats, []):
-        diagnose_infeasibility(list_data)
-
-        failed_days = []
-        failed_windows = []
+    ctx = SolveContext()
+    key = schedule_cache_key(list_data, ctx) if cache_dir else ""
+    # --incremental_from pins to a previous schedule, which a cached full solve knows nothing about
+    cached = load_cached_schedule(key, employees_stats) if key and not _INCREMENTAL_FROM.value else None
+    if cached:
+        solution, status, work, virtual_work = cached
+        print(f"SOLVED (cached schedule {key[:12]})")
+        if _RACE.value:
+            print("--race skipped: the month is solved, there is no relaxed solve to race")
+        if _OUTPUT_PROTO.value:
+            # the model the cached schedule was solved from
+            export_model(load_model(os.path.join(cache_dir, key, "model.pb")), _OUTPUT_PROTO.value)
+        if _STREAM_DIR.value:
+            # the cached schedule is the one solution to stream
+            SnapshotWriter(_STREAM_DIR.value, work, virtual_work, employees, employees_stats, _STREAM_HTML.value)(solution, 1)
+        if _SAVE_SCHEDULE.value:
+            save_schedule(_SAVE_SCHEDULE.value, solution, work, virtual_work, employees)
+        if _EXPORT.value:
+            export_schedule(_EXPORT.value, solution, work, virtual_work, employees, employees_stats)
+        print_solution(solution, status, work, virtual_work, employees, employees_stats)
+        return
 
-        for d in range(month_days):
-            check_days = []
-            check_days.append(d)
-            cost_literals = []
-            cost_coefficients = []
-            work = {}
-            virtual_work = {}
-            black_listed = {}
-            employees = []
-            employees_stats = []
-
-            format_input(list_data, employees, employees_stats)
-            result = solve_shift_scheduling(_OUTPUT_PROTO.value, cost_literals, cost_coefficients, work, virtual_work, black_listed, employees, employees_stats, check_days)
-            print(f"day {d+1} = {result}")
-            if not result:
-                failed_days.append(d + 1)
-
-        for d in range(month_days -4):
-            check_days = []
-            check_days.append(d)
-            check_days.append(d+1)
-            check_days.append(d+2)
-            check_days.append(d + 3)
-            check_days.append(d + 4)
-            cost_literals = []
-            cost_coefficients = []
-            work = {}
-            virtual_work = {}
-            black_listed = {}
-            employees = []
-            employees_stats = []
-
-            format_input(list_data, employees, employees_stats)
-            result = solve_shift_scheduling(_OUTPUT_PROTO.value, cost_literals, cost_coefficients, work, virtual_work, black_listed, employees, employees_stats, check_days)
-            print(f"day {d+1} + 4 days = {result}")
-            if not result:
-                failed_windows.append(d + 1)
-
-        print("\n" + "=" * 72)
-        print("INFEASIBILITY VERDICT")
-        print("=" * 72)
-        if failed_days:
-            print(f"LOCAL infeasibility on individual day(s): {failed_days}")
-            print("  -> a single day cannot be staffed. Check availability (N marks), premium")
-            print("     M1/A1/N1 slots that need level AA/A, and per-day 'P' conflicts on those days.")
-        elif failed_windows:
-            print(f"LOCAL infeasibility on 5-day window(s) starting at day(s): {failed_windows}")
-            print("  -> no single day fails, but a run of days does. Check close-shift / close-night")
-            print("     spacing and clustered availability around those days.")
-        else:
-            print("GLOBAL infeasibility: every single day AND every 5-day window is feasible on")
-            print("its own, but the whole month is not. The blocker is a month-total capacity or")
-            print("cross-family interaction (e.g. nights vs virtual reserves). See the capacity")
-            print("report and constraint-family isolation above for the responsible family.")
-        print("=" * 72)
+    # --race: the relaxed solve starts now instead of after the strict solve and the diagnosis
+    race = None
+    solver_workers = 0
+    if _RACE.value:
+        # the two solves split the cores
+        solver_workers = max(1, (os.cpu_count() or 1) // 2)
+        race = RelaxedRace(list_data, ctx, solver_workers)
+
+    # a day that fails the matching pre-check makes the month infeasible, so skip the full solve
+    impossible_days = report_daily_coverage(employees, ctx)
+    if impossible_days:
+        print(f"\nNOT SOLVED :-( day(s) {impossible_days} cannot be staffed")
+
+    if _INCREMENTAL_FROM.value and not impossible_days:
+        if solve_incremental(list_data, _INCREMENTAL_FROM.value, _SAVE_SCHEDULE.value, _EXPORT.value, ctx):
+            if race:
+                race.cancel()
+            return
+        print("incremental re-solve failed, falling back to a full solve")
+
+    hint = None
+    if _HINT_FROM.value:
+        hint = read_schedule(_HINT_FROM.value, _HINT_ALIGN_WEEKDAYS.value, _HINT_DAY_OFFSET.value)
+        print(f"warm start: {len(hint)} assignments hinted from {_HINT_FROM.value}")
+
+    build_profiler = None
+    if _PROFILE_BUILD.value or _PROFILE_BUILD_JSON.value or _PROFILE_BUILD_CPROFILE.value:
+        build_profiler = BuildProfiler(_PROFILE_BUILD_JSON.value, _PROFILE_BUILD_CPROFILE.value)
+
+    snapshot = None
+    if _STREAM_DIR.value:
+        snapshot = SnapshotWriter(_STREAM_DIR.value, work, virtual_work, employees, employees_stats, _STREAM_HTML.value)
+
+    if impossible_days or not solve_shift_scheduling(_OUTPUT_PROTO.value, cost_literals, cost_coefficients, work, virtual_work, black_listed, employees, employees_stats, [], cache_key=key, hint=hint, schedule_path=_SAVE_SCHEDULE.value, build_profiler=build_profiler, snapshot=snapshot, export_path=_EXPORT.value, solver_workers=solver_workers, ctx=ctx):
+        if race:
+            # the best-effort schedule first, then the diagnosis of why the month fails
+            race.finish()
+        # what the strict solve proved about the whole month; the pre-check proves it infeasible without one
+        month_status = cp_model.INFEASIBLE if impossible_days else ctx.status
+        core = diagnose_infeasibility(list_data, ctx)
+
+        # the conflicting set already names the days and rules involved; the day diagnosis is only
+        # needed when the assumption solves were inconclusive
+        if core is None and _DAY_DIAGNOSIS.value == "minimal":
+            report_infeasible_days(list_data, ctx, month_status)
+        elif core is None:
+            failed_days, failed_windows = sweep_check_days(list_data, _SWEEP_WORKERS.value, ctx)
+
+            print("\n" + "=" * 72)
+            print("INFEASIBILITY VERDICT")
+            print("=" * 72)
+            if failed_days:
+                print(f"LOCAL infeasibility on individual day(s): {failed_days}")
+                print("  -> a single day cannot be staffed. Check availability (N marks), premium")
+                print("     M1/A1/N1 slots that need level AA/A, and per-day 'P' conflicts on those days.")
+            elif failed_windows:
+                print(f"LOCAL infeasibility on 5-day window(s) starting at day(s): {failed_windows}")
+                print("  -> no single day fails, but a run of days does. Check close-shift / close-night")
+                print("     spacing and clustered availability around those days.")
+            else:
+                print("GLOBAL infeasibility: every single day AND every 5-day window is feasible on")
+                print("its own, but the whole month is not. The blocker is a month-total capacity or")
+                print("cross-family interaction (e.g. nights vs virtual reserves). See the capacity")
+                print("report above for the responsible family.")
+            print("=" * 72)
 
         # produce a usable schedule anyway and report exactly which hard rules had to break
-        solve_best_effort(list_data)
+        if not race:
+            solve_best_effort(list_data, ctx)
+    elif race:
+        race.cancel()
 
 
 if __name__ == "__main__":
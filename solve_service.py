@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""Local solve service: one long-running process that queues roster solves onto a bounded process pool.
+
+    POST /jobs                  {"csv": "<input csv text>", "config": {"max_solve_time": 20, ...}}
+                                -> {"id": ..., "status": ...}; the id is the hash of csv + config, so
+                                   resubmitting the same roster returns the running or finished job
+    GET  /jobs                  every known job and its status
+    GET  /jobs/<id>             status, and the exported schedule (see export_schedule) once done
+    GET  /jobs/<id>/events      server-sent events: one per improving solution, then the final status
+    GET  /jobs/<id>/<file>      report.html, best.csv, schedule.json, log.txt, ...
+
+The OR-Tools import happens once in the service; the workers are forked from it. "config"
+overrides, for that job only, any value between #start options and #end options in config.py and
+any value a SolveContext carries (the limit tables, exclusive_groups, ...; see context_options)."""
+import concurrent.futures
+import contextlib
+import csv
+import hashlib
+import http.server
+import json
+import multiprocessing
+import os
+import threading
+import time
+import urllib.parse
+
+from absl import app
+from absl import flags
+
+import config
+import shift_scheduling_hospital as scheduler
+from ortools.sat.python import cp_model
+
+_HOST = flags.DEFINE_string("host", "127.0.0.1", "Address the service listens on.")
+_PORT = flags.DEFINE_integer("port", 8765, "Port the service listens on.")
+_SERVICE_WORKERS = flags.DEFINE_integer("service_workers", 2, "Solves that run at the same time (0 = all cores).")
+_SERVICE_DIR = flags.DEFINE_string("service_dir", ".solve_service", "Where job inputs, logs and results are kept.")
+
+# the options a job may override: the block between "#start options" and "#end options" in config.py,
+# and everything a SolveContext carries
+with open(config.__file__, encoding="utf-8") as _f:
+    _source = _f.read()
+config_options = [line.split("=")[0].strip()
+                  for line in _source[_source.index("#start options"):_source.index("#end options")].splitlines()[1:]
+                  if "=" in line and not line.lstrip().startswith("#")]
+config_options += [name for name in scheduler.context_options if name not in config_options]
+
+# tables keyed by the employee's total shifts; JSON object keys arrive as strings
+limit_tables = ["night_limits", "holiday_limits", "internal_limits", "virtual_limits"]
+
+
+def options_from_json(overrides):
+    """The overrides of a job request as config.py spells them: int keys and tuple rows in the limit tables."""
+    options = dict(overrides)
+    for name in limit_tables:
+        if name not in options:
+            continue
+        try:
+            options[name] = [{int(count): tuple(tuple(bound) for bound in row) for count, row in table.items()}
+                             for table in options[name]]
+        except (AttributeError, TypeError, ValueError):
+            raise ValueError(f"{name}: expected a list of {{total: [[soft, hard, penalty], [soft, hard, penalty]]}}")
+    return options
+
+
+def job_key(csv_text, overrides):
+    digest = hashlib.sha256(csv_text.encode("utf-8"))
+    digest.update(json.dumps(overrides, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+@contextlib.contextmanager
+def config_overrides(overrides):
+    """Apply config overrides that a SolveContext cannot carry (the month, the input file) to the
+    scheduler module for one job, then restore the previous values."""
+    saved = {name: getattr(scheduler, name) for name in overrides}
+    saved["month_starts_with_internal"] = scheduler.month_starts_with_internal
+    try:
+        for name, value in overrides.items():
+            setattr(scheduler, name, value)
+        scheduler.month_starts_with_internal = 1 if scheduler.month_starts_with_internal_shift else 0
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(scheduler, name, value)
+
+
+def run_job(job_dir, overrides, solver_workers):
+    """Solve job_dir/input.csv in a pool worker. Returns the final status dict (also saved as status.json)."""
+    csv_path = os.path.join(job_dir, "input.csv")
+    month_overrides = {name: value for name, value in overrides.items() if name not in scheduler.context_options}
+    with open(os.path.join(job_dir, "log.txt"), "w") as log, contextlib.redirect_stdout(log), \
+            config_overrides(dict(month_overrides, filename=csv_path)):
+        ctx = scheduler.SolveContext(**{name: value for name, value in overrides.items()
+                                        if name in scheduler.context_options})
+        list_data = scheduler.read_input(csv_path)
+        cost_literals = []
+        cost_coefficients = []
+        work = {}
+        virtual_work = {}
+        black_listed = {}
+        employees = []
+        employees_stats = []
+        scheduler.format_input(list_data, employees, employees_stats)
+
+        export_path = os.path.join(job_dir, "schedule.json")
+        report_path = os.path.join(job_dir, "report.html")
+        key = scheduler.schedule_cache_key(list_data, ctx) if scheduler.cache_dir else ""
+        cached = scheduler.load_cached_schedule(key, employees_stats) if key else None
+        if cached:
+            solution, status, work, virtual_work = cached
+            scheduler.export_schedule(export_path, solution, work, virtual_work, employees, employees_stats)
+            scheduler.print_solution(solution, status, work, virtual_work, employees, employees_stats, html_path=report_path)
+            result = {"status": "solved", "cached": True}
+        else:
+            snapshot = scheduler.SnapshotWriter(job_dir, work, virtual_work, employees, employees_stats)
+            if scheduler.solve_shift_scheduling("", cost_literals, cost_coefficients, work, virtual_work, black_listed,
+                                                employees, employees_stats, [], solver_workers=solver_workers,
+                                                cache_key=key, snapshot=snapshot, export_path=export_path,
+                                                report_path=report_path, ctx=ctx):
+                result = {"status": "solved", "cached": False}
+            else:
+                status, core, minimal = scheduler.find_conflicting_rules(list_data, ctx)
+                result = {"status": "not solved", "conflicting_rules": core if status == cp_model.INFEASIBLE else None,
+                          "minimal": minimal if status == cp_model.INFEASIBLE else None}
+    with open(os.path.join(job_dir, "status.json"), "w") as f:
+        json.dump(result, f)
+    return result
+
+
+class SolveService:
+    """Job registry in front of the process pool. Finished jobs are found again on disk after a restart."""
+
+    def __init__(self, directory, workers):
+        self.directory = directory
+        cpus = os.cpu_count() or 1
+        self.workers = workers if workers > 0 else cpus
+        # split the cores between the pool workers so parallel solves do not oversubscribe the machine
+        self.solver_workers = max(1, cpus // self.workers)
+        self.pool = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers,
+                                                           mp_context=multiprocessing.get_context("fork"))
+        self.jobs = {}
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def job_dir(self, job_id):
+        return os.path.join(self.directory, job_id)
+
+    def submit(self, csv_text, overrides):
+        unknown = sorted(set(overrides) - set(config_options))
+        if unknown:
+            raise ValueError(f"unknown config options {unknown}")
+        overrides = options_from_json(overrides)
+        job_id = job_key(csv_text, overrides)
+        with self.lock:
+            known = self.status(job_id)
+            if known and known["status"] != "failed":
+                return known
+            job_dir = self.job_dir(job_id)
+            os.makedirs(job_dir, exist_ok=True)
+            for name in os.listdir(job_dir):
+                os.unlink(os.path.join(job_dir, name))
+            with open(os.path.join(job_dir, "input.csv"), "w", encoding="utf-8") as f:
+                f.write(csv_text)
+            with open(os.path.join(job_dir, "config.json"), "w") as f:
+                json.dump(overrides, f)
+            self.jobs[job_id] = {"future": self.pool.submit(run_job, job_dir, overrides, self.solver_workers),
+                                 "submitted": time.time()}
+        return self.status(job_id)
+
+    def status(self, job_id):
+        """{"id", "status", ...} of a job, or None if it is unknown."""
+        status_path = os.path.join(self.job_dir(job_id), "status.json")
+        job = self.jobs.get(job_id)
+        if job is None or job["future"].done():
+            if job is not None and job["future"].exception() is not None:
+                return {"id": job_id, "status": "failed", "error": repr(job["future"].exception())}
+            if not os.path.isfile(status_path):
+                return None
+            with open(status_path) as f:
+                return dict(json.load(f), id=job_id)
+        return {"id": job_id, "status": "running" if job["future"].running() else "queued",
+                "submitted": job["submitted"]}
+
+    def result(self, job_id):
+        status = self.status(job_id)
+        export_path = os.path.join(self.job_dir(job_id), "schedule.json")
+        if status and status["status"] == "solved" and os.path.isfile(export_path):
+            with open(export_path) as f:
+                status["schedule"] = json.load(f)
+        return status
+
+    def list(self):
+        ids = set(self.jobs) | {name for name in os.listdir(self.directory)
+                                if os.path.isdir(self.job_dir(name))}
+        return [status for status in (self.status(job_id) for job_id in sorted(ids)) if status]
+
+    def events(self, job_id):
+        """Yield one dict per improving solution (from the job's progress.csv), then the final status."""
+        progress_path = os.path.join(self.job_dir(job_id), "progress.csv")
+        sent = 0
+        while True:
+            status = self.status(job_id)
+            if status is None:
+                return
+            if os.path.isfile(progress_path):
+                with open(progress_path, newline="") as f:
+                    rows = list(csv.DictReader(f))
+                for row in rows[sent:]:
+                    yield dict(row, event="solution")
+                sent = len(rows)
+            if status["status"] not in ("queued", "running"):
+                yield dict(status, event="done")
+                return
+            time.sleep(0.5)
+
+
+class ServiceHandler(http.server.BaseHTTPRequestHandler):
+    service = None
+
+    def send_json(self, value, code=200):
+        body = json.dumps(value, ensure_ascii=False).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if urllib.parse.urlparse(self.path).path.rstrip("/") != "/jobs":
+            return self.send_json({"error": "not found"}, 404)
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            status = self.service.submit(request["csv"], request.get("config", {}))
+        except (ValueError, KeyError, TypeError) as e:
+            return self.send_json({"error": str(e)}, 400)
+        self.send_json(status, 202)
+
+    def do_GET(self):
+        parts = [p for p in urllib.parse.urlparse(self.path).path.split("/") if p]
+        if parts == ["jobs"]:
+            return self.send_json(self.service.list())
+        if len(parts) < 2 or parts[0] != "jobs" or self.service.status(parts[1]) is None:
+            return self.send_json({"error": "not found"}, 404)
+        job_id = parts[1]
+        if len(parts) == 2:
+            return self.send_json(self.service.result(job_id))
+        if parts[2:] == ["events"]:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            for event in self.service.events(job_id):
+                self.wfile.write(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+            return
+        path = os.path.join(self.service.job_dir(job_id), os.path.basename(parts[2]))
+        if len(parts) != 3 or not os.path.isfile(path):
+            return self.send_json({"error": "not found"}, 404)
+        with open(path, "rb") as f:
+            body = f.read()
+        content_types = {".html": "text/html", ".json": "application/json", ".csv": "text/csv"}
+        self.send_response(200)
+        self.send_header("Content-Type", content_types.get(os.path.splitext(path)[1], "text/plain") + "; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def main(_):
+    ServiceHandler.service = SolveService(_SERVICE_DIR.value, _SERVICE_WORKERS.value)
+    server = http.server.ThreadingHTTPServer((_HOST.value, _PORT.value), ServiceHandler)
+    print(f"solve service on http://{_HOST.value}:{_PORT.value} ({ServiceHandler.service.workers} worker(s), "
+          f"{ServiceHandler.service.solver_workers} solver thread(s) each)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        ServiceHandler.service.pool.shutdown(cancel_futures=True)
+
+
+if __name__ == "__main__":
+    app.run(main)
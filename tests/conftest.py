@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the scheduler is a script next to config.py, not a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,67 @@
+import os
+
+from ortools.sat.python import cp_model
+
+import shift_scheduling_hospital as scheduler
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def roster_rows():
+    return scheduler.read_input(os.path.join(ROOT, "202608k.csv"))
+
+
+def find_with(monkeypatch, conflict, slow=(), ctx=None):
+    """find_conflicting_rules on the roster, with solves that fail iff every group of `conflict` is assumed.
+
+    Dropping a group of `slow` hits the time limit. Returns the result and the number of solves."""
+    solves = []
+
+    def solve(model, guards, groups, ctx):
+        solves.append(len(groups))
+        if any(g not in groups for g in slow):
+            return cp_model.UNKNOWN, []
+        if set(conflict) <= set(groups):
+            return cp_model.INFEASIBLE, list(groups)
+        return cp_model.FEASIBLE, []
+    monkeypatch.setattr(scheduler, "_solve_with_assumptions", solve)
+    return scheduler.find_conflicting_rules(roster_rows(), ctx), len(solves)
+
+
+def test_narrows_families_then_groups(monkeypatch):
+    conflict = ["coverage of day 3", "coverage of day 20", "ΑΗ: MIN 4"]
+    # these solves report every assumed group as the core, so nothing is narrowed for free
+    ctx = scheduler.SolveContext(diagnostic_refine_solves=40)
+    (status, core, minimal), solves = find_with(monkeypatch, conflict, ctx=ctx)
+    assert (status, sorted(core), minimal) == (cp_model.INFEASIBLE, sorted(conflict), True)
+    # far fewer than one solve per guarded group
+    assert solves < scheduler.month_days
+
+
+def test_time_limit_keeps_the_group_but_not_minimal(monkeypatch):
+    conflict = ["coverage of day 3", "coverage of day 20"]
+    (status, core, minimal), _ = find_with(monkeypatch, conflict, slow=["coverage of day 1"])
+    assert status == cp_model.INFEASIBLE
+    assert set(conflict) < set(core) and "coverage of day 1" in core
+    assert not minimal
+
+
+def test_out_of_refine_solves_keeps_the_families(monkeypatch):
+    conflict = ["coverage of day 3", "coverage of day 20"]
+    ctx = scheduler.SolveContext(diagnostic_refine_solves=0)
+    (status, core, minimal), _ = find_with(monkeypatch, conflict, ctx=ctx)
+    assert status == cp_model.INFEASIBLE
+    assert set(conflict) < set(core) and {scheduler.rule_family(g) for g in core} == {"coverage"}
+    assert not minimal
+
+
+def test_unstaffable_day_is_in_the_core():
+    rows = roster_rows()
+    d = 2
+    marks = len(scheduler.input_columns) + 3 * d
+    for row in rows:
+        row[marks:marks + 3] = ["N", "N", "N"]
+    status, core, _ = scheduler.find_conflicting_rules(rows, scheduler.SolveContext())
+    assert status == cp_model.INFEASIBLE
+    assert f"coverage of day {d + 1}" in core
+    assert "must-not-work (N) preferences" in core
@@ -0,0 +1,73 @@
+import os
+
+import shift_scheduling_hospital as scheduler
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def roster(with_stats=False):
+    employees, employees_stats = [], []
+    scheduler.format_input(scheduler.read_input(os.path.join(ROOT, "202608k.csv")), employees, employees_stats)
+    return (employees, employees_stats) if with_stats else employees
+
+
+def day_solves(employees, employees_stats, d):
+    """Whether CP-SAT can cover day d on its own (a check_days solve)."""
+    return scheduler.solve_shift_scheduling("", [], [], {}, {}, {}, employees, employees_stats, [d],
+                                            ctx=scheduler.SolveContext())
+
+
+def test_max_flow_through_a_shared_node():
+    # two slots reach two employees, but only through one capacity-1 edge
+    capacity = {
+        "source": {"a": 1, "b": 1},
+        "a": {"in": 1},
+        "b": {"in": 1},
+        "in": {"out": 1},
+        "out": {"x": 1, "y": 1},
+        "x": {"sink": 1},
+        "y": {"sink": 1},
+        "sink": {},
+    }
+    assert scheduler._max_flow(capacity, "source", "sink") == 1
+
+
+def test_roster_days_can_be_staffed():
+    employees = roster()
+    assert scheduler.check_daily_coverage(employees, scheduler.SolveContext()) == {}
+
+
+def test_exclusive_group_staffs_one_slot_per_day_part():
+    employees = roster()
+    # with everyone in one group only one slot per day part can be filled
+    ctx = scheduler.SolveContext(exclusive_groups=[list(range(len(employees)))])
+    problems = scheduler.check_daily_coverage(employees, ctx)
+    cal = scheduler.ShiftCalendar()
+    crowded = [d for d in range(scheduler.month_days)
+               if any(sum(cal.required[d][s] for s in cal.day_part_shifts[dp]) > 1 for dp in range(len(scheduler.day_parts)))]
+    assert crowded
+    assert sorted(problems) == crowded
+    assert all("slots can be staffed at once" in p for day_problems in problems.values() for p in day_problems)
+
+
+def test_reserve_without_virtual_shifts_agrees_with_cp_sat():
+    employees, employees_stats = roster(with_stats=True)
+    d = 1  # a virtual reserve day
+    assert scheduler.ShiftCalendar().has_virtual_reserve[d]
+    # only doctors with VIRTUAL_SHIFTS 0 are left for the reserve; the night-keyed limits still let them take it
+    for employee in employees:
+        if employee.virtual_shifts > 0:
+            employee.prefs[d] = scheduler.PREF_N
+    problems = scheduler.check_daily_coverage(employees, scheduler.SolveContext())
+    assert day_solves(employees, employees_stats, d)
+    assert d not in problems
+
+
+def test_unstaffable_day_is_infeasible_for_cp_sat():
+    employees, employees_stats = roster(with_stats=True)
+    d = 1
+    for employee in employees:
+        employee.prefs[d] = scheduler.PREF_N
+    problems = scheduler.check_daily_coverage(employees, scheduler.SolveContext())
+    assert d in problems
+    assert not day_solves(employees, employees_stats, d)
@@ -0,0 +1,13 @@
+import os
+
+import shift_scheduling_hospital as scheduler
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_schedule_without_input_csv_is_refused(tmp_path, capsys):
+    schedule = tmp_path / "hand_made.csv"
+    schedule.write_text("employee,day,weekday,shift\n", encoding="utf-8")
+    rows = scheduler.read_input(os.path.join(ROOT, "202608k.csv"))
+    assert scheduler.solve_incremental(rows, str(schedule)) is False
+    assert f"cannot re-solve incrementally from {schedule}" in capsys.readouterr().out
@@ -0,0 +1,44 @@
+from ortools.sat.python import cp_model
+
+import shift_scheduling_hospital as scheduler
+
+
+def checks(monkeypatch, conflict):
+    """Replace the check solves: infeasible iff every day of `conflict` is covered. Returns the day sets checked."""
+    checked = []
+
+    def status(list_data, days, ctx):
+        checked.append(frozenset(days))
+        return cp_model.INFEASIBLE if set(conflict) <= set(days) else cp_model.FEASIBLE
+    monkeypatch.setattr(scheduler, "_check_days_status", status)
+    return checked
+
+
+def test_quickxplain_finds_the_conflicting_days(monkeypatch):
+    checked = checks(monkeypatch, [2, 19])
+    status, days, solves = scheduler.find_minimal_infeasible_days([], scheduler.SolveContext())
+    assert (status, days) == (cp_model.INFEASIBLE, [2, 19])
+    assert solves == len(set(checked))
+    assert solves < scheduler.month_days
+
+
+def test_single_day_conflict(monkeypatch):
+    checks(monkeypatch, [7])
+    status, days, _ = scheduler.find_minimal_infeasible_days([], scheduler.SolveContext())
+    assert (status, days) == (cp_model.INFEASIBLE, [7])
+
+
+def test_month_status_is_not_proven_again(monkeypatch):
+    checked = checks(monkeypatch, [2, 19])
+    month = frozenset(range(scheduler.month_days))
+    status, days, solves = scheduler.find_minimal_infeasible_days([], scheduler.SolveContext(), cp_model.INFEASIBLE)
+    assert (status, days) == (cp_model.INFEASIBLE, [2, 19])
+    assert month not in checked
+    assert solves == len(set(checked))
+
+
+def test_feasible_month(monkeypatch):
+    checked = checks(monkeypatch, [scheduler.month_days])  # a day outside the month: never infeasible
+    status, days, solves = scheduler.find_minimal_infeasible_days([], scheduler.SolveContext())
+    assert (status, days, solves) == (cp_model.FEASIBLE, [], 1)
+    assert len(checked) == 1
@@ -0,0 +1,41 @@
+import os
+
+import pandas
+import pytest
+
+import shift_scheduling_hospital as scheduler
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize("name", ["202608k.csv", "july.csv"])
+def test_rows_match_pandas(name):
+    path = os.path.join(ROOT, name)
+    assert scheduler.read_input(path) == pandas.read_csv(path).fillna("I").values.tolist()
+
+
+def write_roster(tmp_path, edit):
+    with open(os.path.join(ROOT, "202608k.csv"), encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    edit(lines)
+    path = tmp_path / "roster.csv"
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return str(path)
+
+
+def test_short_row_is_padded(tmp_path):
+    def drop_last_marks(lines):
+        lines[1] = lines[1].rsplit(",", 3)[0]
+    rows = scheduler.read_input(write_roster(tmp_path, drop_last_marks))
+    assert rows[0][-3:] == ["I", "I", "I"]
+
+
+@pytest.mark.parametrize("edit, message", [
+    (lambda lines: lines.__setitem__(2, lines[2].replace(",5,6,", ",x,6,", 1)), ":3: MIN"),
+    (lambda lines: lines.__setitem__(3, lines[3] + ",N"), ":4: 101 cells"),
+    (lambda lines: lines.__setitem__(4, lines[4].replace(",N,", ",Q,", 1)), ":5: unknown preference mark"),
+    (lambda lines: lines.__setitem__(0, lines[0].rsplit(",", 3)[0]), ":1: 97 columns"),
+])
+def test_malformed_line_is_named(tmp_path, edit, message):
+    with pytest.raises(ValueError, match=message):
+        scheduler.read_input(write_roster(tmp_path, edit))
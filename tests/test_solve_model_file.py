@@ -0,0 +1,18 @@
+from ortools.sat.python import cp_model
+
+import shift_scheduling_hospital as scheduler
+
+
+def test_only_work_cells_are_listed(tmp_path, capsys):
+    model = cp_model.CpModel()
+    cells = [model.new_bool_var("work0_1_2"), model.new_bool_var("virtual_work3_4"),
+             model.new_bool_var("worked_pref_0_2_1"), model.new_bool_var("work_hours")]
+    model.add_bool_and(cells)
+    model.minimize(sum(cells))
+    path = str(tmp_path / "model.pb")
+    model.export_to_file(path)
+
+    assert scheduler.solve_model_file(path)
+    out = capsys.readouterr().out
+    assert f"day 3: {scheduler.shifts[1]}=0" in out
+    assert "day 5: VIRTUAL=3" in out
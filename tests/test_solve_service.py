@@ -0,0 +1,21 @@
+import json
+
+import pytest
+
+import config
+import solve_service
+
+
+def test_context_options_can_be_overridden():
+    assert {"exclusive_groups", "night_limits", "hot_periods"} <= set(solve_service.config_options)
+
+
+def test_limit_tables_round_trip_through_json():
+    request = json.loads(json.dumps({"virtual_limits": config.virtual_limits, "exclusive_groups": [[1, 2]]}))
+    options = solve_service.options_from_json(request)
+    assert options == {"virtual_limits": config.virtual_limits, "exclusive_groups": [[1, 2]]}
+
+
+def test_malformed_limit_table_is_rejected():
+    with pytest.raises(ValueError, match="night_limits"):
+        solve_service.options_from_json({"night_limits": [{"one": [[0, 0, 0], [0, 0, 0]]}]})
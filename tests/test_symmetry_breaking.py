@@ -0,0 +1,55 @@
+import itertools
+import os
+
+from ortools.sat.python import cp_model
+
+import shift_scheduling_hospital as scheduler
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def lex_solutions(n):
+    """Every (first, second) pair of n-bit vectors that add_lex_greater_equal admits."""
+    model = cp_model.CpModel()
+    first = [model.new_bool_var(f"a{i}") for i in range(n)]
+    second = [model.new_bool_var(f"b{i}") for i in range(n)]
+    scheduler.add_lex_greater_equal(model, first, second, "lex")
+
+    class Collector(cp_model.CpSolverSolutionCallback):
+        def __init__(self):
+            super().__init__()
+            self.pairs = set()
+
+        def on_solution_callback(self):
+            self.pairs.add((tuple(self.value(a) for a in first), tuple(self.value(b) for b in second)))
+
+    solver = cp_model.CpSolver()
+    solver.parameters.enumerate_all_solutions = True
+    collector = Collector()
+    solver.solve(model, collector)
+    return collector.pairs
+
+
+def test_lex_greater_equal_admits_exactly_the_ordered_pairs():
+    vectors = list(itertools.product([0, 1], repeat=4))
+    assert lex_solutions(4) == {(a, b) for a in vectors for b in vectors if a >= b}
+
+
+def test_lex_greater_equal_single_literal():
+    assert lex_solutions(1) == {((0,), (0,)), ((1,), (0,)), ((1,), (1,))}
+
+
+def test_hint_turns_symmetry_breaking_off(monkeypatch):
+    groups = []
+    monkeypatch.setattr(scheduler, "add_symmetry_breaking", lambda model, grps, *rest: groups.append(grps))
+    rows = scheduler.read_input(os.path.join(ROOT, "202608k.csv"))
+    rows.append([rows[0][0] + " 2"] + rows[0][1:])  # an interchangeable copy of the first doctor
+    for hint in (None, {(rows[0][0], 0, scheduler.shifts[0])}):
+        employees, employees_stats = [], []
+        scheduler.format_input(rows, employees, employees_stats)
+        ctx = scheduler.SolveContext()
+        scheduler.solve_shift_scheduling("", [], [], {}, {}, {}, employees, employees_stats, [0], hint=hint, ctx=ctx)
+        # recorded on the caller's context even though the solve ran on a copy without symmetry breaking
+        assert ctx.status is not None
+    # only the unhinted solve orders the pair
+    assert groups == [[[0, len(rows) - 1]]]